@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import zlib
+import struct
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+from aiohttp import web
+
+if __package__:
+    from .engine import DownloadEngine, BackgroundLoop, DEFAULT_CONFIG
+    from .cli import apply_overrides
+else:
+    from engine import DownloadEngine, BackgroundLoop, DEFAULT_CONFIG
+    from cli import apply_overrides
+
+
+PDF_SIZES = {
+    'small': 64 * 1024,
+    'medium': 4 * 1024 * 1024,
+    'large': 32 * 1024 * 1024
+}
+
+SCENARIOS = {
+    'pdf-small': ('pdf/small.pdf', 200),
+    'pdf-large-range': ('pdf/large.pdf', 4),
+    'pdf-large-norange': ('norange/large.pdf', 4),
+    'pdf-throttled': ('slow/medium.pdf', 8),
+    'html-static': ('html/static', 10),
+    'html-lazy': ('html/lazy', 5),
+    'html-scroll': ('html/scroll', 3)
+}
+
+BENCH_CONFIG = {
+    'manifest': False,
+    'subresource_cache': False,
+    'per_host_connections': 64,
+    'per_host_rate': 0,
+    'wait_time': 1,
+    'scroll_pause': 1,
+    'max_scroll_time': 20
+}
+
+RANGE_RE = re.compile(r'bytes=(\d+)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+STATIC_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Static {n}</title></head>
+<body><h1>Static page {n}</h1>{paragraphs}</body></html>"""
+
+LAZY_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Lazy {n}</title>
+<style>img {{ display: block; width: 600px; height: 400px; margin: 20px 0; background: #eee; }}</style></head>
+<body><h1>Lazy page {n}</h1>{images}</body></html>"""
+
+SCROLL_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Scroll {n}</title>
+<style>.item {{ height: 300px; border-bottom: 1px solid #ccc; }}</style></head>
+<body><h1>Infinite scroll {n}</h1><div id="feed">{items}</div>
+<script>
+let page = 0;
+let loading = false;
+window.addEventListener('scroll', async () => {{
+    if (loading || page >= {pages}) return;
+    if (window.innerHeight + window.scrollY < document.body.scrollHeight - 400) return;
+    loading = true;
+    page += 1;
+    const response = await fetch('/feed/' + page);
+    document.getElementById('feed').insertAdjacentHTML('beforeend', await response.text());
+    loading = false;
+}});
+</script></body></html>"""
+
+
+def make_png(width=64, height=64):
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    rows = b''.join(b'\x00' + b'\x80\x80\x80' * width for _ in range(height))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b''))
+
+
+PNG_IMAGE = make_png()
+
+
+def make_pdf(size):
+    line = b'72 72 m 540 720 l S % mypdf benchmark fixture padding ........\n'
+    content = line * max(1, (size - 600) // len(line))
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << >> /Contents 4 0 R >>',
+        b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream'
+    ]
+
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def current_rss():
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+
+    if psutil is not None:
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+class FixtureServer:
+    def __init__(self, host='127.0.0.1', port=0, bandwidth=2 * 1024 * 1024, asset_delay=0.05):
+        self.host = host
+        self.port = port
+        self.bandwidth = bandwidth
+        self.asset_delay = asset_delay
+        self.pdfs = {}
+        self.runner = None
+
+    @property
+    def base_url(self):
+        return f'http://{self.host}:{self.port}'
+
+    def pdf(self, name):
+        if name not in self.pdfs:
+            self.pdfs[name] = make_pdf(PDF_SIZES[name])
+        return self.pdfs[name]
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/pdf/{name}.pdf', lambda r: self.serve_pdf(r, ranges=True))
+        app.router.add_get('/norange/{name}.pdf', lambda r: self.serve_pdf(r, ranges=False))
+        app.router.add_get('/slow/{name}.pdf', lambda r: self.serve_pdf(r, ranges=True, rate=self.bandwidth))
+        app.router.add_get('/html/static', self.serve_static)
+        app.router.add_get('/html/lazy', self.serve_lazy)
+        app.router.add_get('/html/scroll', self.serve_scroll)
+        app.router.add_get('/img/{name}.png', self.serve_image)
+        app.router.add_get('/feed/{page}', self.serve_feed)
+
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.port = self.runner.addresses[0][1]
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def serve_pdf(self, request, ranges=True, rate=0):
+        name = request.match_info['name']
+        if name not in PDF_SIZES:
+            raise web.HTTPNotFound()
+
+        body = self.pdf(name)
+        etag = f'"{name}-{len(body)}"'
+        headers = {'Content-Type': 'application/pdf', 'ETag': etag}
+        start, end, status = 0, len(body) - 1, 200
+
+        if ranges:
+            headers['Accept-Ranges'] = 'bytes'
+            match = RANGE_RE.match(request.headers.get('Range', ''))
+            if match and request.headers.get('If-Range', etag) == etag and int(match[1]) < len(body):
+                start = int(match[1])
+                end = min(int(match[2]), len(body) - 1) if match[2] else len(body) - 1
+                status = 206
+                headers['Content-Range'] = f'bytes {start}-{end}/{len(body)}'
+
+        response = web.StreamResponse(status=status, headers=headers)
+        response.content_length = end - start + 1
+        await response.prepare(request)
+
+        view = memoryview(body)[start:end + 1]
+        try:
+            for offset in range(0, len(view), CHUNK_SIZE):
+                chunk = view[offset:offset + CHUNK_SIZE]
+                await response.write(chunk)
+                if rate:
+                    await asyncio.sleep(len(chunk) / rate)
+            await response.write_eof()
+        except ConnectionError:
+            pass
+        return response
+
+    async def serve_static(self, request):
+        n = request.query.get('n', '0')
+        paragraphs = ''.join(f'<p>Paragraph {i} of static page {n}. ' + 'Lorem ipsum dolor sit amet. ' * 20 + '</p>'
+                             for i in range(60))
+        return web.Response(text=STATIC_HTML.format(n=n, paragraphs=paragraphs), content_type='text/html')
+
+    async def serve_lazy(self, request):
+        n = request.query.get('n', '0')
+        images = ''.join(f'<img class="lazy" loading="lazy" data-src="/img/{n}-{i}.png" alt="">' for i in range(30))
+        return web.Response(text=LAZY_HTML.format(n=n, images=images), content_type='text/html')
+
+    async def serve_scroll(self, request):
+        n = request.query.get('n', '0')
+        items = ''.join(f'<div class="item">Item {i}</div>' for i in range(5))
+        return web.Response(text=SCROLL_HTML.format(n=n, items=items, pages=8), content_type='text/html')
+
+    async def serve_feed(self, request):
+        await asyncio.sleep(self.asset_delay)
+        page = request.match_info['page']
+        items = ''.join(f'<div class="item">Page {page} item {i}</div>' for i in range(5))
+        return web.Response(text=items, content_type='text/html')
+
+    async def serve_image(self, request):
+        await asyncio.sleep(self.asset_delay)
+        return web.Response(body=PNG_IMAGE, content_type='image/png', headers={'Cache-Control': 'no-store'})
+
+
+async def sample_rss(peak, interval=0.05):
+    while True:
+        peak[0] = max(peak[0], current_rss())
+        await asyncio.sleep(interval)
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+async def run_scenario(name, base_url, config):
+    path, count = SCENARIOS[name]
+    urls = [f'{base_url}/{path}?n={i}' for i in range(count)]
+
+    finished = []
+
+    def on_update(job):
+        if job.finished:
+            finished.append(job)
+
+    save_path = tempfile.mkdtemp(prefix=f'mypdf-bench-{name}-')
+    engine = DownloadEngine(dict(config, save_path=save_path), on_update=on_update)
+
+    baseline_rss = current_rss()
+    peak = [baseline_rss]
+    sampler = asyncio.ensure_future(sample_rss(peak))
+
+    started = time.perf_counter()
+    try:
+        summary = await engine.run_stream(iter(urls))
+        seconds = time.perf_counter() - started
+    finally:
+        sampler.cancel()
+        await asyncio.gather(sampler, return_exceptions=True)
+        await engine.close()
+
+    latencies = [job.trace.elapsed() for job in finished]
+    stages = {}
+    for job in finished:
+        for stage, duration in job.trace.stages().items():
+            stages.setdefault(stage, []).append(duration)
+
+    result = {
+        'name': name,
+        'urls': count,
+        'done': summary['done'],
+        'failed': summary['failed'],
+        'seconds': round(seconds, 4),
+        'urls_per_sec': round(count / seconds, 3) if seconds else None,
+        'latency': {
+            'p50': round(percentile(latencies, 50) or 0, 4),
+            'p95': round(percentile(latencies, 95) or 0, 4),
+            'max': round(max(latencies, default=0), 4)
+        },
+        'stages': {stage: round(sum(values) / len(values), 4) for stage, values in sorted(stages.items())},
+        'bytes_written': directory_size(save_path),
+        'bytes_downloaded': sum(job.trace.bytes for job in finished),
+        'requests': sum(job.trace.requests for job in finished),
+        'peak_rss_mb': round(peak[0] / 1024 / 1024, 1),
+        'rss_growth_mb': round((peak[0] - baseline_rss) / 1024 / 1024, 1),
+        'errors': sorted({job.error for job in finished if job.error})[:5]
+    }
+    shutil.rmtree(save_path, ignore_errors=True)
+    return result
+
+
+def browser_available():
+    try:
+        import playwright.async_api
+        return True
+    except ImportError:
+        return False
+
+
+async def run_benchmarks(names, base_url, config, repeat=1):
+    results = []
+    for name in names:
+        if name.startswith('html-') and not browser_available():
+            results.append({'name': name, 'skipped': '未安装 playwright'})
+            continue
+        for _ in range(repeat):
+            result = await run_scenario(name, base_url, config)
+            results.append(result)
+            print(format_result(result), file=sys.stderr)
+    return results
+
+
+def format_result(result):
+    if 'skipped' in result:
+        return f"{result['name']:<20} 跳过: {result['skipped']}"
+    return (f"{result['name']:<20} {result['done']:>4}/{result['urls']:<4} "
+            f"{result['urls_per_sec']:>9.2f} 个/秒  p50 {result['latency']['p50']:.3f}s  "
+            f"p95 {result['latency']['p95']:.3f}s  RSS {result['peak_rss_mb']:.0f}MB  "
+            f"写入 {result['bytes_written'] / 1024 / 1024:.1f}MB")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {r['name']: r for r in json.load(f)['scenarios'] if 'skipped' not in r}
+
+    print("\n与基准对比:", file=sys.stderr)
+    for result in results:
+        old = baseline.get(result['name'])
+        if 'skipped' in result or not old:
+            continue
+        speed = (result['urls_per_sec'] / old['urls_per_sec'] - 1) * 100 if old['urls_per_sec'] else 0
+        p95 = (result['latency']['p95'] / old['latency']['p95'] - 1) * 100 if old['latency']['p95'] else 0
+        print(f"{result['name']:<20} 吞吐 {speed:+.1f}%  p95 {p95:+.1f}%", file=sys.stderr)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m mypdf.benchmark', description='离线基准测试（本地 HTTP 服务器）')
+    parser.add_argument('scenarios', nargs='*', metavar='SCENARIO',
+                        help=f"要运行的场景，默认全部: {', '.join(SCENARIOS)}")
+    parser.add_argument('-s', '--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='覆盖引擎配置项，VALUE 按 JSON 解析')
+    parser.add_argument('-o', '--output', default='-', help='JSON 结果输出文件，默认标准输出')
+    parser.add_argument('-n', '--repeat', type=int, default=1, help='每个场景重复次数')
+    parser.add_argument('--bandwidth', type=int, default=2 * 1024 * 1024, help='限速场景的带宽（字节/秒）')
+    parser.add_argument('--baseline', help='与之前保存的 JSON 结果对比')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"未知场景: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    config = dict(DEFAULT_CONFIG)
+    config.update(BENCH_CONFIG)
+    apply_overrides(config, args.set)
+
+    server = FixtureServer(bandwidth=args.bandwidth)
+    server_loop = BackgroundLoop()
+    try:
+        server_loop.submit(server.start()).result()
+        results = asyncio.run(run_benchmarks(names, server.base_url, config, max(1, args.repeat)))
+    finally:
+        server_loop.submit(server.close()).result()
+        server_loop.stop()
+
+    report = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'overrides': args.set,
+        'scenarios': results
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+    if args.baseline:
+        compare(results, args.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+
+
+BROWSER_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-web-security',
+    '--disable-features=IsolateOrigins,site-per-process',
+    '--disable-setuid-sandbox',
+    '--disable-accelerated-2d-canvas',
+    '--disable-gpu'
+]
+
+
+class BrowserSlot:
+    def __init__(self, browser):
+        self.browser = browser
+        self.pages_served = 0
+        self.active = 0
+        self.retiring = False
+
+    def is_healthy(self):
+        return self.browser.is_connected()
+
+    async def close(self):
+        try:
+            await self.browser.close()
+        except Exception:
+            pass
+
+
+class BrowserPool:
+    def __init__(self, size=1, max_pages_per_browser=50, context_options=None):
+        self.size = max(1, int(size))
+        self.max_pages_per_browser = max(1, int(max_pages_per_browser))
+        self.context_options = context_options or dict
+        self.playwright = None
+        self.slots = []
+        self.lock = None
+
+    def resize(self, size):
+        self.size = max(1, int(size))
+
+    async def start(self):
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        if self.playwright is None:
+            self.playwright = await async_playwright().start()
+
+    async def launch(self):
+        browser = await self.playwright.chromium.launch(headless=True, args=BROWSER_ARGS)
+
+        context = await browser.new_context()
+        try:
+            page = await context.new_page()
+            await page.goto('about:blank')
+        finally:
+            await context.close()
+
+        return BrowserSlot(browser)
+
+    async def retire(self, slot):
+        slot.retiring = True
+        if slot in self.slots:
+            self.slots.remove(slot)
+        if slot.active == 0:
+            await slot.close()
+
+    async def fill(self):
+        for slot in [s for s in self.slots if not s.is_healthy()]:
+            await self.retire(slot)
+
+        while len(self.slots) > self.size:
+            await self.retire(min(self.slots, key=lambda s: s.active))
+
+        missing = self.size - len(self.slots)
+        if missing > 0:
+            self.slots.extend(await asyncio.gather(*[self.launch() for _ in range(missing)]))
+
+    async def warm_up(self):
+        await self.start()
+        async with self.lock:
+            await self.fill()
+
+    async def acquire(self):
+        await self.start()
+        async with self.lock:
+            await self.fill()
+
+            slot = min(self.slots, key=lambda s: s.active)
+            slot.active += 1
+            slot.pages_served += 1
+            if slot.pages_served >= self.max_pages_per_browser:
+                slot.retiring = True
+                self.slots.remove(slot)
+            return slot
+
+    async def release(self, slot):
+        slot.active -= 1
+        if slot.retiring and slot.active == 0:
+            await slot.close()
+
+    @asynccontextmanager
+    async def page(self, **context_overrides):
+        slot = await self.acquire()
+        context = None
+        try:
+            options = dict(self.context_options())
+            options.update(context_overrides)
+            context = await slot.browser.new_context(**options)
+            yield await context.new_page()
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+            await self.release(slot)
+
+    def stats(self):
+        return [
+            {'healthy': s.is_healthy(), 'pages_served': s.pages_served, 'active': s.active}
+            for s in self.slots
+        ]
+
+    async def close(self):
+        slots, self.slots = self.slots, []
+        for slot in slots:
+            await slot.close()
+
+        if self.playwright is not None:
+            try:
+                await self.playwright.stop()
+            except Exception:
+                pass
+            self.playwright = None
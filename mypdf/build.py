@@ -16,7 +16,7 @@ def check_requirements():
         print("错误: 需要 Python 3.7 或更高版本")
         return False
 
-    required_packages = ['pyinstaller', 'requests', 'playwright']
+    required_packages = ['pyinstaller', 'aiohttp', 'playwright']
     missing_packages = []
 
     for package in required_packages:
@@ -85,6 +85,7 @@ a = Analysis(
     hiddenimports=[
         'playwright',
         'playwright.sync_api',
+        'playwright.async_api',
         'playwright._impl',
         'playwright._impl._sync_base',
         'playwright._impl._browser',
@@ -103,6 +104,9 @@ a = Analysis(
         'playwright._impl._path_utils',
         'playwright._impl._str_utils',
         'playwright._impl._greenlets',
+        'engine',
+        'browser_pool',
+        'aiohttp',
         'requests',
         'urllib3',
         'certifi',
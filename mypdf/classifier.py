@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+from urllib.parse import urlparse
+
+
+PDF_MAGIC = b'%PDF-'
+SNIFF_SIZE = 1024
+
+VOLATILE_SEGMENT = re.compile(r'\d|^[0-9a-fA-F-]{16,}$|^[A-Za-z0-9_-]{24,}$')
+
+
+def sniff_kind(content_type, head):
+    if PDF_MAGIC in head[:SNIFF_SIZE]:
+        return 'pdf'
+    if head or 'html' in (content_type or '').lower():
+        return 'webpage'
+    return None
+
+
+def path_pattern(path):
+    segments = []
+    for segment in path.split('/'):
+        name, dot, ext = segment.rpartition('.')
+        if dot and name and ext.isalnum() and len(ext) <= 5:
+            segments.append('*.' + ext.lower())
+        elif VOLATILE_SEGMENT.search(segment):
+            segments.append('*')
+        else:
+            segments.append(segment)
+    return '/'.join(segments) or '/'
+
+
+class UrlClassifier:
+    def __init__(self):
+        self.cache = {}
+
+    def pattern_key(self, url):
+        parsed = urlparse(url)
+        return parsed.netloc.lower(), path_pattern(parsed.path)
+
+    def lookup(self, url):
+        kind = self.cache.get(self.pattern_key(url))
+        return kind if kind in ('pdf', 'webpage') else None
+
+    def record(self, url, kind):
+        if kind not in ('pdf', 'webpage'):
+            return
+
+        key = self.pattern_key(url)
+        previous = self.cache.get(key)
+        if previous is None:
+            self.cache[key] = kind
+        elif previous != kind:
+            self.cache[key] = 'mixed'
+
+    def unknown_groups(self, urls):
+        groups = {}
+        for url in urls:
+            if self.pattern_key(url) not in self.cache:
+                groups.setdefault(self.pattern_key(url), []).append(url)
+        return groups
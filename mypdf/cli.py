@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import signal
+import asyncio
+import argparse
+
+if __package__:
+    from .engine import DownloadEngine, DEFAULT_CONFIG
+    from .ingest import iter_url_lines
+    from .postprocess import OPTIMIZE_MODES, pikepdf_available
+    from .html_render import HTML_ENGINES, weasyprint_available
+    from .render_worker import psutil_available
+else:
+    from engine import DownloadEngine, DEFAULT_CONFIG
+    from ingest import iter_url_lines
+    from postprocess import OPTIMIZE_MODES, pikepdf_available
+    from html_render import HTML_ENGINES, weasyprint_available
+    from render_worker import psutil_available
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m mypdf', description='批量PDF下载器（命令行模式）')
+    parser.add_argument('urls', nargs='?', default='-', help='URL 文件，每行一个；省略或 "-" 表示从标准输入读取')
+    parser.add_argument('-c', '--config', default='config.json', help='配置文件，键名与 config.json 相同')
+    parser.add_argument('-s', '--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='覆盖配置项，VALUE 按 JSON 解析，例如 -s full_load=false')
+    parser.add_argument('-d', '--save-path', help='保存位置，等同于 -s save_path=...')
+    parser.add_argument('-o', '--output', default='-', help='JSON Lines 结果输出文件，默认标准输出')
+    parser.add_argument('--resume', action='store_true', help='继续保存位置下上次未完成的任务（忽略 URL 文件）')
+    parser.add_argument('--trace', help='各阶段耗时记录（JSON Lines），等同于 -s trace_file=...')
+    parser.add_argument('--metrics-port', type=int, help='在 127.0.0.1 上提供 Prometheus 指标 /metrics，等同于 -s metrics_port=...')
+    parser.add_argument('--optimize', choices=OPTIMIZE_MODES, help='完成后压缩、去重并线性化 PDF，等同于 -s optimize_pdfs=...')
+    parser.add_argument('--html-engine', choices=HTML_ENGINES,
+                        help='网页渲染方式：auto 先判断是否需要 JavaScript，静态页面用 WeasyPrint，等同于 -s html_engine=...')
+    parser.add_argument('--merge', metavar='FILE', help='全部完成后合并为一个 PDF（保存在保存位置下），等同于 -s merge_output=...')
+    return parser.parse_args(argv)
+
+
+def apply_overrides(config, items):
+    for item in items:
+        key, sep, value = item.partition('=')
+        if not sep or key not in DEFAULT_CONFIG:
+            raise SystemExit(f"无效的配置项: {item}")
+        try:
+            config[key] = json.loads(value)
+        except ValueError:
+            config[key] = value
+    return config
+
+
+def load_config(args):
+    config = dict(DEFAULT_CONFIG)
+
+    if os.path.exists(args.config):
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config.update(json.load(f))
+
+    apply_overrides(config, args.set)
+
+    if args.save_path:
+        config['save_path'] = args.save_path
+    if args.trace:
+        config['trace_file'] = args.trace
+    if args.metrics_port is not None:
+        config['metrics_port'] = args.metrics_port
+    if args.optimize:
+        config['optimize_pdfs'] = args.optimize
+    if args.merge:
+        config['merge_output'] = args.merge
+    if args.html_engine:
+        config['html_engine'] = args.html_engine
+
+    return config
+
+
+async def run(config, output, source='-', resume=False):
+    def on_update(job):
+        if job.finished:
+            output.write(json.dumps(job.to_dict(), ensure_ascii=False) + '\n')
+            output.flush()
+
+    engine = DownloadEngine(config, on_update=on_update)
+
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGINT, engine.stop)
+        loop.add_signal_handler(signal.SIGTERM, engine.stop)
+    except (NotImplementedError, RuntimeError):
+        pass
+
+    try:
+        if resume:
+            batch = await engine.unfinished_batch()
+            if batch is None:
+                return None
+            counts = batch['counts']
+            print(f"继续上次的任务：已完成 {counts['done']}，剩余 {counts['pending'] + counts['running']}",
+                  file=sys.stderr)
+            return await engine.run_stream(resume=batch['id'])
+        if source == '-':
+            return await engine.run_stream(iter_url_lines(source))
+        return await engine.run_stream(sources=[os.path.abspath(source)])
+    finally:
+        await engine.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = load_config(args)
+
+    if not args.resume and args.urls != '-' and not os.path.exists(args.urls):
+        print(f"找不到文件: {args.urls}", file=sys.stderr)
+        return 2
+
+    if (config['optimize_pdfs'] != 'none' or config['merge_output']) and not pikepdf_available():
+        print("未安装 pikepdf，将跳过 PDF 优化与合并（pip install pikepdf）", file=sys.stderr)
+    if config['html_engine'] == 'auto' and not weasyprint_available():
+        print("未安装 weasyprint，所有网页将使用浏览器渲染（pip install weasyprint）", file=sys.stderr)
+    if int(config['render_workers']) > 0 and int(config['render_worker_max_rss_mb']) > 0 and not psutil_available():
+        print("未安装 psutil，render_worker_max_rss_mb 内存上限不会生效（pip install psutil）", file=sys.stderr)
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'a', encoding='utf-8')
+    try:
+        summary = asyncio.run(run(config, output, args.urls, args.resume))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    if summary is None:
+        print("没有未完成的任务", file=sys.stderr)
+        return 2
+    if not summary['accepted']:
+        print("没有可下载的地址", file=sys.stderr)
+        return 2
+
+    print(f"完成 {summary['done']}/{summary['accepted']}（重复 {summary['duplicates']}，"
+          f"无效 {summary['invalid']}）", file=sys.stderr)
+    bundle = summary['bundle']
+    if bundle and 'error' in bundle:
+        print(f"合并失败: {bundle['error']}", file=sys.stderr)
+    elif bundle:
+        print(f"已合并 {bundle['files']} 个文件（{bundle['pages']} 页）: {bundle['path']}", file=sys.stderr)
+    return 0 if summary['done'] == summary['accepted'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
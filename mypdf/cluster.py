@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+from itertools import islice
+
+import aiohttp
+from aiohttp import web
+
+if __package__:
+    from .engine import DownloadEngine, DEFAULT_CONFIG, JOBS_NAME, INGEST_BATCH
+    from .ingest import UrlDedupe, IngestStats, iter_unique_urls, iter_sources, iter_url_lines
+    from .job_store import JobStore, make_owner
+    from .cli import apply_overrides
+else:
+    from engine import DownloadEngine, DEFAULT_CONFIG, JOBS_NAME, INGEST_BATCH
+    from ingest import UrlDedupe, IngestStats, iter_unique_urls, iter_sources, iter_url_lines
+    from job_store import JobStore, make_owner
+    from cli import apply_overrides
+
+
+DEFAULT_PORT = 8765
+POLL_INTERVAL = 1.0
+RECONNECT_TIMEOUT = 60
+WORKER_HEADER = 'X-Mypdf-Worker'
+
+
+class Coordinator:
+    def __init__(self, config, output=None):
+        self.config = config
+        self.output = output
+        self.save_path = config['save_path']
+        self.lease = max(1.0, float(config['job_lease']))
+        self.token = config['cluster_token']
+        os.makedirs(self.save_path, exist_ok=True)
+        self.store = JobStore(os.path.join(self.save_path, JOBS_NAME))
+        self.batch_id = None
+        self.ingest = IngestStats()
+        self.ingested = False
+        self.workers = {}
+        self.reserved = set()
+        self.complete = False
+        self.finished = asyncio.Event()
+        self.runner = None
+        self.tasks = []
+
+    def open_batch(self, lines=None, sources=None, resume=None):
+        if resume is None:
+            self.batch_id = self.store.create_batch(sources)['id']
+            return lines if lines is not None else iter_sources(sources or [])
+
+        batch = self.store.batch(resume)
+        if batch is None:
+            raise ValueError(f'找不到未完成的任务批次: {resume}')
+        self.batch_id = resume
+        self.ingest = IngestStats(**batch['stats'])
+        self.ingested = bool(batch['ingested']) or batch['sources'] is None
+        self.store.recover(resume)
+        return iter_sources([] if self.ingested else batch['sources'], self.ingest.lines)
+
+    async def start(self, host, port, lines):
+        app = web.Application()
+        app.router.add_post('/claim', self.handle_claim)
+        app.router.add_post('/heartbeat', self.handle_heartbeat)
+        app.router.add_post('/jobs/{id}/result', self.handle_result)
+        app.router.add_get('/status', self.handle_status)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+
+        self.tasks = [asyncio.ensure_future(self.read_urls(lines)), asyncio.ensure_future(self.monitor())]
+
+    async def read_urls(self, lines):
+        loop = asyncio.get_running_loop()
+        urls = iter_unique_urls(lines, self.config['strip_query_params'],
+                                UrlDedupe(int(self.config['dedupe_exact_limit'])), self.ingest)
+        while not self.ingested:
+            chunk = await loop.run_in_executor(None, lambda: list(islice(urls, INGEST_BATCH)))
+            self.ingested = not chunk
+            self.store.add(self.batch_id, chunk, self.ingest, self.ingested)
+
+    def remaining(self):
+        self.store.flush()
+        counts = self.store.counts(self.batch_id)
+        return counts['pending'] + counts['running']
+
+    async def monitor(self):
+        while not self.finished.is_set():
+            await asyncio.sleep(POLL_INTERVAL)
+            self.store.flush(force=False)
+            if self.ingested and not self.remaining():
+                self.complete = True
+                self.finished.set()
+
+    def check_auth(self, request):
+        if self.token and request.headers.get('Authorization') != f'Bearer {self.token}':
+            raise web.HTTPUnauthorized()
+
+    def seen(self, worker, **info):
+        state = self.workers.setdefault(worker, {'active': 0, 'done': 0, 'failed': 0})
+        state.update(info)
+        state['seen'] = time.time()
+        return state
+
+    async def handle_claim(self, request):
+        self.check_auth(request)
+        data = await request.json()
+        worker = data['worker']
+        jobs = self.store.claim(self.batch_id, max(0, int(data.get('limit', 1))), self.lease, owner=worker)
+        self.seen(worker)
+        done = not jobs and self.ingested and not self.remaining()
+        return web.json_response({
+            'jobs': [{'id': job_id, 'url': url} for job_id, url in jobs],
+            'lease': self.lease,
+            'done': done
+        })
+
+    async def handle_heartbeat(self, request):
+        self.check_auth(request)
+        data = await request.json()
+        self.store.renew(self.lease, owner=data['worker'], job_ids=data.get('jobs', []))
+        self.seen(data['worker'], active=int(data.get('active', 0)))
+        return web.json_response({'lease': self.lease, 'done': self.complete})
+
+    def reserve_path(self, filename):
+        filename = os.path.basename(filename or '') or f'job_{time.strftime("%Y%m%d_%H%M%S")}.pdf'
+        base_name, ext = os.path.splitext(filename)
+        path = os.path.join(self.save_path, filename)
+        counter = 1
+        while path in self.reserved or os.path.exists(path):
+            path = os.path.join(self.save_path, f"{base_name}_{counter}{ext}")
+            counter += 1
+        self.reserved.add(path)
+        return path
+
+    async def handle_result(self, request):
+        self.check_auth(request)
+        job_id = int(request.match_info['id'])
+        worker = request.headers.get(WORKER_HEADER, '')
+        uploader = f'{worker}#result'
+        if not self.store.transfer(job_id, worker, uploader, self.lease):
+            return web.json_response({'accepted': False}, status=409)
+
+        try:
+            result = await self.receive_result(request)
+        except BaseException:
+            self.store.transfer(job_id, uploader, worker, self.lease)
+            raise
+
+        state = result.get('state', 'failed')
+        result['worker'] = worker
+        self.store.finish(job_id, state, max(0, result.get('attempts', 1) - 1), result, result.get('error'),
+                          owner=uploader)
+        stats = self.seen(worker)
+        if state in ('done', 'failed'):
+            stats[state] += 1
+            if self.output is not None:
+                self.output.write(json.dumps(result, ensure_ascii=False) + '\n')
+                self.output.flush()
+        return web.json_response({'accepted': True, 'path': result.get('path')})
+
+    async def receive_result(self, request):
+        reader = await request.multipart()
+        part = await reader.next()
+        if part is None or part.name != 'result':
+            raise web.HTTPBadRequest(text='missing result')
+        result = await part.json()
+
+        if result.get('state', 'failed') == 'done':
+            part = await reader.next()
+            if part is None or part.name != 'file':
+                raise web.HTTPBadRequest(text='missing file')
+            path = self.reserve_path(result.get('path'))
+            try:
+                with open(path + '.part', 'wb') as f:
+                    while True:
+                        chunk = await part.read_chunk()
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                os.replace(path + '.part', path)
+            finally:
+                self.reserved.discard(path)
+            result['path'] = path
+        return result
+
+    async def handle_status(self, request):
+        self.check_auth(request)
+        self.store.flush()
+        now = time.time()
+        workers = {
+            worker: dict(state, seen=round(now - state['seen'], 1))
+            for worker, state in self.workers.items()
+        }
+        return web.json_response({
+            'batch': self.batch_id,
+            'ingested': self.ingested,
+            'ingest': self.ingest.to_dict(),
+            'counts': self.store.counts(self.batch_id),
+            'workers': workers
+        })
+
+    def summary(self):
+        self.store.flush()
+        counts = self.store.counts(self.batch_id)
+        summary = self.ingest.to_dict()
+        summary.update(done=counts['done'], failed=counts['failed'],
+                       stopped=counts['pending'] + counts['running'], batch=self.batch_id)
+        return summary
+
+    async def close(self, linger=0):
+        if self.complete:
+            self.store.close_batch(self.batch_id)
+        if linger:
+            await asyncio.sleep(linger)
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+        self.store.close()
+
+
+class Worker:
+    def __init__(self, url, config, jobs=8):
+        self.url = url.rstrip('/')
+        self.id = make_owner()
+        self.capacity = max(1, int(jobs))
+        self.headers = {'Authorization': f"Bearer {config['cluster_token']}"} if config['cluster_token'] else {}
+        self.engine = DownloadEngine(dict(config, job_store=False, manifest=False, merge_output=''))
+        self.session = None
+        self.lease = float(config['job_lease'])
+        self.active = {}
+        self.stopping = False
+        self.counts = {'done': 0, 'failed': 0, 'stopped': 0, 'rejected': 0}
+
+    def stop(self):
+        self.stopping = True
+        self.engine.stop()
+
+    async def call(self, path, payload):
+        deadline = time.monotonic() + RECONNECT_TIMEOUT
+        while True:
+            try:
+                async with self.session.post(f'{self.url}{path}', json=payload) as response:
+                    response.raise_for_status()
+                    return await response.json()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def heartbeat(self):
+        while True:
+            await asyncio.sleep(max(1.0, self.lease / 3))
+            try:
+                data = await self.call('/heartbeat', {'worker': self.id, 'active': len(self.active),
+                                                      'jobs': list(self.active)})
+                self.lease = float(data['lease'])
+            except aiohttp.ClientError:
+                continue
+
+    async def post_result(self, job_id, result, path=None):
+        deadline = time.monotonic() + RECONNECT_TIMEOUT
+        while True:
+            form = aiohttp.FormData()
+            form.add_field('result', json.dumps(result, ensure_ascii=False), content_type='application/json')
+            f = open(path, 'rb') if path else None
+            try:
+                if f is not None:
+                    form.add_field('file', f, filename=os.path.basename(path), content_type='application/pdf')
+                async with self.session.post(f'{self.url}/jobs/{job_id}/result', data=form,
+                                             headers={WORKER_HEADER: self.id}) as response:
+                    if response.status == 409:
+                        return False
+                    response.raise_for_status()
+                    return True
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(POLL_INTERVAL)
+            finally:
+                if f is not None:
+                    f.close()
+
+    async def report(self, job_id, job):
+        result = job.to_dict()
+        state = job.state
+        try:
+            try:
+                accepted = await self.post_result(job_id, result, job.filepath if state == 'done' else None)
+            except aiohttp.ClientResponseError as e:
+                state = 'failed'
+                result.update(state=state, path=None, error=f'上传结果失败: HTTP {e.status} {e.message}')
+                accepted = await self.post_result(job_id, result)
+            self.counts[state if accepted else 'rejected'] += 1
+        finally:
+            if job.filepath:
+                self.engine.reserved_paths.discard(job.filepath)
+                if job.state == 'done' and os.path.exists(job.filepath):
+                    os.remove(job.filepath)
+
+    async def work(self, job_id, url):
+        try:
+            job = await self.engine.submit(url)
+            await self.report(job_id, job)
+        finally:
+            self.active.pop(job_id, None)
+
+    async def run(self):
+        self.session = aiohttp.ClientSession(headers=self.headers, timeout=aiohttp.ClientTimeout(total=None, connect=10))
+        await self.engine.start()
+        beat = asyncio.ensure_future(self.heartbeat())
+        try:
+            while True:
+                done = False
+                free = self.capacity - len(self.active)
+                if free > 0 and not self.stopping:
+                    data = await self.call('/claim', {'worker': self.id, 'limit': free})
+                    self.lease = float(data['lease'])
+                    done = data['done']
+                    for item in data['jobs']:
+                        self.active[item['id']] = asyncio.ensure_future(self.work(item['id'], item['url']))
+
+                if not self.active:
+                    if done or self.stopping:
+                        break
+                    await asyncio.sleep(POLL_INTERVAL)
+                    continue
+                await asyncio.wait(list(self.active.values()), timeout=POLL_INTERVAL,
+                                   return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            beat.cancel()
+            await asyncio.gather(beat, *self.active.values(), return_exceptions=True)
+            await self.session.close()
+            await self.engine.close()
+        return self.counts
+
+
+def load_config(args):
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(args.config):
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config.update(json.load(f))
+    apply_overrides(config, args.set)
+    if args.save_path:
+        config['save_path'] = args.save_path
+    if args.token:
+        config['cluster_token'] = args.token
+    return config
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m mypdf.cluster', description='多机分布式下载：协调节点与工作节点')
+    sub = parser.add_subparsers(dest='role', required=True)
+
+    coordinator = sub.add_parser('coordinator', help='持有任务队列，把任务租给工作节点并接收结果文件')
+    coordinator.add_argument('urls', nargs='?', default='-', help='URL 文件，每行一个；省略或 "-" 表示从标准输入读取')
+    coordinator.add_argument('--host', default='127.0.0.1', help='监听地址，其他机器访问时设为 0.0.0.0')
+    coordinator.add_argument('--port', type=int, default=DEFAULT_PORT, help='监听端口')
+    coordinator.add_argument('--resume', action='store_true', help='继续保存位置下上次未完成的任务（忽略 URL 文件）')
+    coordinator.add_argument('-o', '--output', default='-', help='JSON Lines 结果输出文件，默认标准输出')
+
+    worker = sub.add_parser('worker', help='从协调节点领取任务，下载或渲染后把文件传回')
+    worker.add_argument('coordinator', help='协调节点地址，例如 http://10.0.0.5:8765')
+    worker.add_argument('-j', '--jobs', type=int, help='同时处理的任务数，默认 worker_jobs')
+
+    for role in (coordinator, worker):
+        role.add_argument('-c', '--config', default='config.json', help='配置文件，键名与 config.json 相同')
+        role.add_argument('-s', '--set', action='append', default=[], metavar='KEY=VALUE',
+                          help='覆盖配置项，VALUE 按 JSON 解析')
+        role.add_argument('-d', '--save-path', help='保存位置；工作节点用作临时目录')
+        role.add_argument('--token', help='节点间共享的访问令牌，等同于 -s cluster_token=...')
+    return parser.parse_args(argv)
+
+
+def install_signal_handlers(callback):
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGINT, callback)
+        loop.add_signal_handler(signal.SIGTERM, callback)
+    except (NotImplementedError, RuntimeError):
+        pass
+
+
+async def run_coordinator(args, config, output):
+    coordinator = Coordinator(config, output)
+    resume = None
+    if args.resume:
+        batch = coordinator.store.unfinished()
+        if batch is None:
+            coordinator.store.close()
+            return None
+        resume = batch['id']
+    if resume is not None:
+        lines = coordinator.open_batch(resume=resume)
+    elif args.urls == '-':
+        lines = coordinator.open_batch(lines=iter_url_lines('-'))
+    else:
+        lines = coordinator.open_batch(sources=[os.path.abspath(args.urls)])
+
+    await coordinator.start(args.host, args.port, lines)
+    print(f"协调节点已启动: http://{args.host}:{args.port}（批次 {coordinator.batch_id}）", file=sys.stderr)
+    install_signal_handlers(coordinator.finished.set)
+    try:
+        await coordinator.finished.wait()
+        return coordinator.summary()
+    finally:
+        await coordinator.close(linger=POLL_INTERVAL * 2)
+
+
+async def run_worker(args, config):
+    worker = Worker(args.coordinator, config, args.jobs or config['worker_jobs'])
+    install_signal_handlers(worker.stop)
+    return await worker.run()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = load_config(args)
+
+    if args.role == 'worker':
+        try:
+            counts = asyncio.run(run_worker(args, config))
+        except aiohttp.ClientError as e:
+            print(f"无法连接协调节点: {e}", file=sys.stderr)
+            return 2
+        print(f"完成 {counts['done']}，失败 {counts['failed']}，已停止 {counts['stopped']}，"
+              f"被拒绝 {counts['rejected']}", file=sys.stderr)
+        return 0
+
+    if not args.resume and args.urls != '-' and not os.path.exists(args.urls):
+        print(f"找不到文件: {args.urls}", file=sys.stderr)
+        return 2
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'a', encoding='utf-8')
+    try:
+        summary = asyncio.run(run_coordinator(args, config, output))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    if summary is None:
+        print("没有未完成的任务", file=sys.stderr)
+        return 2
+    print(f"完成 {summary['done']}/{summary['accepted']}（重复 {summary['duplicates']}，"
+          f"无效 {summary['invalid']}）", file=sys.stderr)
+    return 0 if summary['done'] == summary['accepted'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,17 +3,18 @@
 
 import os
 import sys
-import time
 import json
+import queue
+import multiprocessing
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from urllib.parse import urlparse, unquote
-from datetime import datetime
-import threading
-import requests
-from playwright.sync_api import sync_playwright
-import random
-import queue
+
+if __package__:
+    from .engine import DownloadEngine, BackgroundLoop, DEFAULT_CONFIG
+    from .task_view import TaskStore, VirtualTaskView, STATUS_FILTERS
+else:
+    from engine import DownloadEngine, BackgroundLoop, DEFAULT_CONFIG
+    from task_view import TaskStore, VirtualTaskView, STATUS_FILTERS
 
 
 class PDFDownloaderGUI:
@@ -25,13 +26,19 @@ class PDFDownloaderGUI:
 
         self.setup_styles()
         self.is_downloading = False
-        self.stop_event = threading.Event()
         self.config_file = 'config.json'
         self.load_config()
+        self.task_store = TaskStore()
+        self.url_count_job = None
+        self.import_files = []
         self.create_widgets()
-        self.session = self.create_session()
-        self.download_queue = queue.Queue()
-        self.current_task_index = 0
+        self.engine = DownloadEngine(self.config, on_update=self.on_job_update)
+        self.engine_loop = BackgroundLoop()
+        self.finished_tasks = 0
+        self.ui_events = queue.SimpleQueue()
+        self.ui_refresh_ms = max(10, int(1000 / max(1, self.config.get('ui_refresh_hz', 10))))
+        self.root.after(self.ui_refresh_ms, self.flush_ui_events)
+        self.root.after(200, self.check_unfinished)
 
     def setup_styles(self):
         style = ttk.Style()
@@ -44,39 +51,8 @@ class PDFDownloaderGUI:
         style.configure('Info.TLabel', foreground='blue')
         style.configure('Warning.TLabel', foreground='orange')
 
-    def create_session(self):
-        session = requests.Session()
-        session.headers.update({
-            'User-Agent': self.get_random_user_agent(),
-            'Accept': '*/*',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive'
-        })
-        return session
-
-    def get_random_user_agent(self):
-        agents = [
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36'
-        ]
-        return random.choice(agents)
-
     def load_config(self):
-        self.config = {
-            'save_path': os.path.join(os.getcwd(), 'downloads'),
-            'wait_time': 3,
-            'page_size': 'A4',
-            'landscape': False,
-            'scale': 1.0,
-            'print_background': True,
-            'block_images': False,
-            'remove_popups': True,
-            'full_load': True,
-            'scroll_pause': 2,
-            'max_scroll_time': 60
-        }
+        self.config = dict(DEFAULT_CONFIG)
 
         try:
             if os.path.exists(self.config_file):
@@ -95,10 +71,17 @@ class PDFDownloaderGUI:
                 'scale': self.scale_var.get(),
                 'print_background': self.print_bg_var.get(),
                 'block_images': self.block_images_var.get(),
+                'block_media': self.block_media_var.get(),
+                'block_fonts': self.block_fonts_var.get(),
+                'block_trackers': self.block_trackers_var.get(),
+                'block_third_party_scripts': self.block_third_party_var.get(),
                 'remove_popups': self.remove_popups_var.get(),
                 'full_load': self.full_load_var.get(),
                 'scroll_pause': self.scroll_pause_var.get(),
-                'max_scroll_time': self.max_scroll_var.get()
+                'max_scroll_time': self.max_scroll_var.get(),
+                'direct_workers': self.direct_workers_var.get(),
+                'browser_pool_size': self.browser_pool_size_var.get(),
+                'render_concurrency': self.render_concurrency_var.get()
             })
 
             with open(self.config_file, 'w', encoding='utf-8') as f:
@@ -152,36 +135,23 @@ class PDFDownloaderGUI:
         self.url_count_label = ttk.Label(url_frame, text="共 0 个链接")
         self.url_count_label.pack(pady=(10, 0))
 
-        self.url_text.bind('<KeyRelease>', self.update_url_count)
+        self.url_text.bind('<KeyRelease>', self.schedule_url_count)
 
         task_frame = ttk.LabelFrame(right_frame, text="任务列表", padding="10")
         task_frame.pack(fill='both', expand=True, padx=(5, 0))
 
-        columns = ('序号', '地址', '状态', '进度', '文件名')
-        self.task_tree = ttk.Treeview(task_frame, columns=columns, show='headings', height=15)
-
-        self.task_tree.heading('序号', text='序号')
-        self.task_tree.heading('地址', text='地址')
-        self.task_tree.heading('状态', text='状态')
-        self.task_tree.heading('进度', text='进度')
-        self.task_tree.heading('文件名', text='文件名')
-
-        self.task_tree.column('序号', width=50)
-        self.task_tree.column('地址', width=300)
-        self.task_tree.column('状态', width=80)
-        self.task_tree.column('进度', width=80)
-        self.task_tree.column('文件名', width=200)
+        filter_frame = ttk.Frame(task_frame)
+        filter_frame.pack(fill='x', pady=(0, 5))
 
-        tree_scrollbar = ttk.Scrollbar(task_frame, orient='vertical', command=self.task_tree.yview)
-        self.task_tree.configure(yscrollcommand=tree_scrollbar.set)
+        ttk.Label(filter_frame, text="显示:").pack(side='left', padx=(0, 5))
+        self.task_filter_var = tk.StringVar(value='全部')
+        filter_combo = ttk.Combobox(filter_frame, textvariable=self.task_filter_var,
+                                    values=list(STATUS_FILTERS), width=8, state='readonly')
+        filter_combo.pack(side='left')
+        filter_combo.bind('<<ComboboxSelected>>', self.on_filter_changed)
 
-        self.task_tree.pack(side='left', fill='both', expand=True)
-        tree_scrollbar.pack(side='right', fill='y')
-
-        self.task_tree.tag_configure('pending', foreground='gray')
-        self.task_tree.tag_configure('downloading', foreground='blue')
-        self.task_tree.tag_configure('success', foreground='green')
-        self.task_tree.tag_configure('error', foreground='red')
+        self.task_view = VirtualTaskView(task_frame, self.task_store)
+        self.task_view.pack(fill='both', expand=True)
 
         settings_frame = ttk.LabelFrame(main_frame, text="设置", padding="10")
         settings_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
@@ -224,6 +194,22 @@ class PDFDownloaderGUI:
                                                                                               padx=(0, 20))
         ttk.Checkbutton(options_frame, text="完整加载", variable=self.full_load_var).grid(row=0, column=3)
 
+        self.block_trackers_var = tk.BooleanVar(value=self.config.get('block_trackers', True))
+        self.block_media_var = tk.BooleanVar(value=self.config.get('block_media', True))
+        self.block_fonts_var = tk.BooleanVar(value=self.config.get('block_fonts', False))
+        self.block_third_party_var = tk.BooleanVar(value=self.config.get('block_third_party_scripts', False))
+
+        ttk.Checkbutton(options_frame, text="屏蔽广告跟踪", variable=self.block_trackers_var).grid(row=1, column=0,
+                                                                                                  padx=(0, 20),
+                                                                                                  pady=(5, 0))
+        ttk.Checkbutton(options_frame, text="屏蔽音视频", variable=self.block_media_var).grid(row=1, column=1,
+                                                                                             padx=(0, 20), pady=(5, 0))
+        ttk.Checkbutton(options_frame, text="屏蔽网页字体", variable=self.block_fonts_var).grid(row=1, column=2,
+                                                                                                padx=(0, 20),
+                                                                                                pady=(5, 0))
+        ttk.Checkbutton(options_frame, text="屏蔽第三方脚本", variable=self.block_third_party_var).grid(row=1, column=3,
+                                                                                                      pady=(5, 0))
+
         scroll_frame = ttk.Frame(settings_frame)
         scroll_frame.grid(row=3, column=0, columnspan=3, pady=(10, 0), sticky=(tk.W, tk.E))
 
@@ -237,8 +223,25 @@ class PDFDownloaderGUI:
         ttk.Spinbox(scroll_frame, from_=10, to=300, textvariable=self.max_scroll_var, width=8, increment=10).grid(row=0,
                                                                                                                   column=3)
 
+        worker_frame = ttk.Frame(settings_frame)
+        worker_frame.grid(row=4, column=0, columnspan=3, pady=(10, 0), sticky=(tk.W, tk.E))
+
+        ttk.Label(worker_frame, text="下载并发数:").grid(row=0, column=0, sticky='w', padx=(0, 10))
+        self.direct_workers_var = tk.IntVar(value=self.config.get('direct_workers', 8))
+        ttk.Spinbox(worker_frame, from_=1, to=256, textvariable=self.direct_workers_var, width=8).grid(row=0, column=1,
+                                                                                                     padx=(0, 20))
+
+        ttk.Label(worker_frame, text="浏览器数:").grid(row=0, column=2, padx=(0, 10))
+        self.browser_pool_size_var = tk.IntVar(value=self.config.get('browser_pool_size', 1))
+        ttk.Spinbox(worker_frame, from_=1, to=8, textvariable=self.browser_pool_size_var, width=8).grid(row=0, column=3,
+                                                                                                         padx=(0, 20))
+
+        ttk.Label(worker_frame, text="渲染并发数:").grid(row=0, column=4, padx=(0, 10))
+        self.render_concurrency_var = tk.IntVar(value=self.config.get('render_concurrency', 4))
+        ttk.Spinbox(worker_frame, from_=1, to=32, textvariable=self.render_concurrency_var, width=8).grid(row=0, column=5)
+
         scale_frame = ttk.Frame(settings_frame)
-        scale_frame.grid(row=4, column=0, columnspan=3, pady=(10, 0), sticky=(tk.W, tk.E))
+        scale_frame.grid(row=5, column=0, columnspan=3, pady=(10, 0), sticky=(tk.W, tk.E))
 
         ttk.Label(scale_frame, text="缩放:").grid(row=0, column=0, sticky='w', padx=(0, 10))
         self.scale_var = tk.DoubleVar(value=self.config['scale'])
@@ -273,9 +276,18 @@ class PDFDownloaderGUI:
         ttk.Button(button_frame, text="打开文件夹", command=self.open_folder).grid(row=0, column=2, padx=(0, 10))
         ttk.Button(button_frame, text="清空任务", command=self.clear_tasks).grid(row=0, column=3)
 
+    def schedule_url_count(self, event=None):
+        if self.url_count_job is not None:
+            self.root.after_cancel(self.url_count_job)
+        self.url_count_job = self.root.after(300, self.update_url_count)
+
     def update_url_count(self, event=None):
+        self.url_count_job = None
         urls = self.get_urls()
-        self.url_count_label.config(text=f"共 {len(urls)} 个链接")
+        text = f"共 {len(urls)} 个链接"
+        if self.import_files:
+            text += f"，另有 {len(self.import_files)} 个导入文件"
+        self.url_count_label.config(text=text)
 
     def get_urls(self):
         text = self.url_text.get(1.0, tk.END).strip()
@@ -300,26 +312,23 @@ class PDFDownloaderGUI:
             title="选择URL文件",
             filetypes=[("文本文件", "*.txt"), ("所有文件", "*.*")]
         )
-        if file_path:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    urls = f.read().strip()
-                    current_text = self.url_text.get(1.0, tk.END).strip()
-                    if current_text:
-                        self.url_text.insert(tk.END, '\n' + urls)
-                    else:
-                        self.url_text.insert(1.0, urls)
-                    self.update_url_count()
-            except Exception as e:
-                messagebox.showerror("错误", f"导入失败: {str(e)}")
+        if file_path and file_path not in self.import_files:
+            self.import_files.append(file_path)
+            self.update_url_count()
 
     def clear_urls(self):
         self.url_text.delete(1.0, tk.END)
+        self.import_files = []
         self.update_url_count()
 
     def clear_tasks(self):
-        for item in self.task_tree.get_children():
-            self.task_tree.delete(item)
+        self.task_store.clear()
+        self.task_view.refresh()
+
+    def on_filter_changed(self, event=None):
+        self.task_store.set_filter(STATUS_FILTERS[self.task_filter_var.get()])
+        self.task_view.offset = 0
+        self.task_view.refresh()
 
     def browse_folder(self):
         folder = filedialog.askdirectory(initialdir=self.save_path_var.get())
@@ -336,296 +345,47 @@ class PDFDownloaderGUI:
             else:
                 os.system(f'xdg-open "{path}"')
 
-    def is_pdf_url(self, url):
+    def on_close(self):
+        self.engine.stop()
         try:
-            if url.lower().endswith('.pdf'):
-                return True
-            response = self.session.head(url, timeout=5, allow_redirects=True)
-            return 'application/pdf' in response.headers.get('Content-Type', '').lower()
-        except:
-            return False
-
-    def get_filename_from_url(self, url, is_pdf=True):
-        parsed = urlparse(url)
-        filename = os.path.basename(unquote(parsed.path))
-
-        if not is_pdf:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"webpage_{timestamp}.pdf"
-        elif not filename or not filename.endswith('.pdf'):
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"download_{timestamp}.pdf"
-
-        return filename
-
-    def update_task_status(self, item_id, status, progress='', filename=''):
-        tag = 'pending'
-        if status == '下载中':
-            tag = 'downloading'
-        elif status == '完成':
-            tag = 'success'
-        elif '失败' in status or '错误' in status:
-            tag = 'error'
-
-        values = list(self.task_tree.item(item_id, 'values'))
-        values[2] = status
-        if progress:
-            values[3] = progress
-        if filename:
-            values[4] = filename
-
-        self.task_tree.item(item_id, values=values, tags=(tag,))
-        self.task_tree.see(item_id)
-
-    def download_pdf_direct(self, url, filepath, item_id):
-        try:
-            self.update_task_status(item_id, '下载中')
-            response = self.session.get(url, stream=True, timeout=30)
-            response.raise_for_status()
-
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded = 0
-
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if self.stop_event.is_set():
-                        self.update_task_status(item_id, '已停止')
-                        return False
-
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
+            self.engine_loop.submit(self.engine.close()).result(timeout=5)
+        except Exception:
+            pass
+        self.engine_loop.stop()
+        self.root.destroy()
 
-                        if total_size > 0:
-                            progress = (downloaded / total_size) * 100
-                            self.update_task_status(item_id, '下载中', f"{progress:.1f}%")
+    def stop_download(self):
+        self.engine.stop()
+        self.status_label.config(text="正在停止...", style='Warning.TLabel')
 
-            self.update_task_status(item_id, '完成', '100%', os.path.basename(filepath))
-            return True
-        except Exception as e:
-            self.update_task_status(item_id, f'失败: {str(e)}')
-            return False
+    def check_unfinished(self):
+        future = self.engine_loop.submit(self.engine.unfinished_batch())
+        future.add_done_callback(lambda f: self.ui_events.put(('unfinished', f)))
 
-    def convert_webpage_to_pdf(self, url, filepath, item_id):
+    def on_unfinished(self, future):
         try:
-            self.update_task_status(item_id, '启动浏览器')
-
-            with sync_playwright() as p:
-                browser = p.chromium.launch(
-                    headless=True,
-                    args=[
-                        '--disable-blink-features=AutomationControlled',
-                        '--no-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-web-security',
-                        '--disable-features=IsolateOrigins,site-per-process',
-                        '--disable-setuid-sandbox',
-                        '--disable-accelerated-2d-canvas',
-                        '--disable-gpu'
-                    ]
-                )
-
-                context = browser.new_context(
-                    viewport={'width': 1920, 'height': 1080},
-                    user_agent=self.get_random_user_agent(),
-                    bypass_csp=True,
-                    ignore_https_errors=True,
-                    locale='zh-CN',
-                    storage_state={
-                        'cookies': [
-                            {
-                                'name': 'CONSENT',
-                                'value': 'YES+',
-                                'domain': '.kaggle.com',
-                                'path': '/'
-                            },
-                            {
-                                'name': 'kaggle_cookie_consent',
-                                'value': 'accepted',
-                                'domain': '.kaggle.com',
-                                'path': '/'
-                            }
-                        ]
-                    }
-                )
-
-                page = context.new_page()
-                page.set_default_timeout(60000)
-
-                if self.block_images_var.get():
-                    page.route("**/*.{png,jpg,jpeg,gif,webp,svg}", lambda route: route.abort())
-
-                self.update_task_status(item_id, '加载页面')
-
-                page.goto(url, wait_until='domcontentloaded', timeout=45000)
-
-                if self.remove_popups_var.get():
-                    try:
-                        page.wait_for_timeout(1000)
-                        cookie_selectors = [
-                            'button:has-text("OK, Got it")',
-                            'button:has-text("Accept")',
-                            'button:has-text("Accept all")',
-                            'button:has-text("I agree")',
-                            'button:has-text("同意")',
-                            '[aria-label*="accept"]',
-                            '[aria-label*="Accept"]'
-                        ]
-
-                        for selector in cookie_selectors:
-                            try:
-                                btn = page.query_selector(selector)
-                                if btn and btn.is_visible():
-                                    btn.click()
-                                    page.wait_for_timeout(500)
-                                    break
-                            except:
-                                continue
-                    except:
-                        pass
-
-                page.wait_for_load_state('load', timeout=30000)
-
-                wait_time = self.wait_time_var.get()
-                if wait_time > 0:
-                    self.update_task_status(item_id, f'等待{wait_time}秒')
-                    for i in range(wait_time):
-                        if self.stop_event.is_set():
-                            browser.close()
-                            return None
-                        time.sleep(1)
-
-                if self.remove_popups_var.get():
-                    page.evaluate("""
-                        () => {
-                            const selectors = [
-                                '.modal', '.popup', '.overlay', '.dialog', 
-                                '[class*="modal"]', '[class*="popup"]', '[role="dialog"]',
-                                '[class*="cookie"]', '[class*="consent"]', '[class*="gdpr"]',
-                                '.alert', '.banner', '.notification',
-                                'div[style*="position: fixed"]', 'div[style*="position:fixed"]'
-                            ];
-
-                            selectors.forEach(s => {
-                                document.querySelectorAll(s).forEach(el => {
-                                    const style = getComputedStyle(el);
-                                    if (style.zIndex > 100 || style.position === 'fixed') {
-                                        el.remove();
-                                    }
-                                });
-                            });
-
-                            document.body.style.overflow = '';
-                            document.documentElement.style.overflow = '';
-                            document.body.classList.remove('modal-open', 'no-scroll');
-                        }
-                    """)
-
-                if self.full_load_var.get():
-                    self.update_task_status(item_id, '加载内容')
-
-                    page.evaluate("""
-                        () => {
-                            const lazySelectors = [
-                                'img[data-src]', 'img[data-lazy]', 'img[data-original]',
-                                'img.lazy', 'img.lazyload', '[data-background-image]',
-                                'img[loading="lazy"]', 'img[data-lazy-src]'
-                            ];
-
-                            lazySelectors.forEach(selector => {
-                                document.querySelectorAll(selector).forEach(img => {
-                                    if (img.dataset.src) img.src = img.dataset.src;
-                                    if (img.dataset.lazySrc) img.src = img.dataset.lazySrc;
-                                    if (img.dataset.original) img.src = img.dataset.original;
-                                    if (img.dataset.backgroundImage) {
-                                        img.style.backgroundImage = `url(${img.dataset.backgroundImage})`;
-                                    }
-                                    img.removeAttribute('loading');
-                                });
-                            });
-
-                            window.dispatchEvent(new Event('scroll'));
-                            window.dispatchEvent(new Event('resize'));
-                        }
-                    """)
-
-                    self.update_task_status(item_id, '滚动加载')
-                    scroll_pause = self.scroll_pause_var.get() * 1000
-                    max_scroll_time = self.max_scroll_var.get()
-                    start_scroll_time = time.time()
-
-                    last_height = 0
-                    no_change_count = 0
-
-                    while True:
-                        if self.stop_event.is_set():
-                            browser.close()
-                            return None
-
-                        current_height = page.evaluate("document.body.scrollHeight")
-
-                        if current_height == last_height:
-                            no_change_count += 1
-                            if no_change_count >= 3:
-                                break
-                        else:
-                            no_change_count = 0
-
-                        last_height = current_height
-
-                        page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                        page.wait_for_timeout(scroll_pause)
-
-                        elapsed = time.time() - start_scroll_time
-                        if elapsed > max_scroll_time:
-                            break
-
-                    page.evaluate("window.scrollTo(0, 0)")
-                    page.wait_for_timeout(1000)
-
-                self.update_task_status(item_id, '生成PDF')
-
-                try:
-                    title = page.title()
-                    if title:
-                        import re
-                        title = re.sub(r'[<>:"/\\|?*]', '', title).strip()[:50]
-                        if title:
-                            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                            filepath = os.path.join(os.path.dirname(filepath), f"{title}_{timestamp}.pdf")
-                except:
-                    pass
-
-                page.pdf(
-                    path=filepath,
-                    format=self.page_size_var.get(),
-                    landscape=self.landscape_var.get(),
-                    print_background=self.print_bg_var.get(),
-                    scale=self.scale_var.get(),
-                    margin={'top': '1cm', 'bottom': '1cm', 'left': '1cm', 'right': '1cm'},
-                    prefer_css_page_size=True
-                )
-
-                browser.close()
-
-                self.update_task_status(item_id, '完成', '100%', os.path.basename(filepath))
-                return filepath
-
-        except Exception as e:
-            self.update_task_status(item_id, f'失败: {str(e)}')
-            return None
+            batch = future.result()
+        except Exception:
+            return
+        if batch is None or self.is_downloading:
+            return
 
-    def stop_download(self):
-        self.stop_event.set()
-        self.status_label.config(text="正在停止...", style='Warning.TLabel')
+        counts = batch['counts']
+        message = f"上次的任务还有 {counts['pending'] + counts['running']} 个地址未完成（已完成 {counts['done']} 个）"
+        if not batch['ingested']:
+            message += "，地址文件也尚未读完"
+        if messagebox.askyesno("继续上次的任务", message + "，是否继续下载？"):
+            self.start_download(resume=batch['id'])
+        else:
+            self.engine_loop.submit(self.engine.discard_batch(batch['id']))
 
-    def start_download(self):
+    def start_download(self, resume=None):
         if self.is_downloading:
             messagebox.showwarning("警告", "已有下载任务进行中！")
             return
 
         urls = self.get_urls()
-        if not urls:
+        if resume is None and not urls and not self.import_files:
             messagebox.showerror("错误", "请输入下载地址！")
             return
 
@@ -636,97 +396,140 @@ class PDFDownloaderGUI:
             os.makedirs(save_path)
 
         self.clear_tasks()
-
-        for i, url in enumerate(urls):
-            if not url.startswith(('http://', 'https://')):
-                url = 'https://' + url
-
-            item_id = self.task_tree.insert('', 'end', values=(i + 1, url, '等待中', '', ''), tags=('pending',))
-            self.download_queue.put((url, item_id))
+        sources = ([urls] if urls else []) + [os.path.abspath(path) for path in self.import_files]
 
         self.is_downloading = True
-        self.stop_event.clear()
+        self.finished_tasks = 0
         self.download_btn.config(state='disabled')
         self.stop_btn.config(state='normal')
+        self.reset_overall_progress()
         self.overall_progress_var.set(0)
-        self.current_task_index = 0
+        self.status_label.config(text="正在读取地址..." if resume is None else "正在继续上次的任务...",
+                                 style='Info.TLabel')
+
+        self.engine_loop.call(self.engine.configure, dict(self.config))
+        self.engine.ingest_done = False
+        self.engine.resumed_finished = 0
+        if resume is None:
+            future = self.engine_loop.submit(self.engine.run_stream(sources=sources))
+        else:
+            future = self.engine_loop.submit(self.engine.run_stream(resume=resume))
+        future.add_done_callback(lambda f: self.ui_events.put(('batch', f)))
+
+    def on_job_update(self, job):
+        self.ui_events.put(('job', job.task_id, job.url, job.status, job.progress, job.filename, job.finished))
+
+    def flush_ui_events(self):
+        try:
+            self.apply_ui_events()
+        finally:
+            self.root.after(self.ui_refresh_ms, self.flush_ui_events)
+
+    def apply_ui_events(self):
+        latest = {}
+        finished = 0
+        batch_future = None
+        unfinished_future = None
+
+        while True:
+            try:
+                event = self.ui_events.get_nowait()
+            except queue.Empty:
+                break
+
+            if event[0] == 'batch':
+                batch_future = event[1]
+                continue
+            if event[0] == 'unfinished':
+                unfinished_future = event[1]
+                continue
+
+            _, item_id, url, status, progress, filename, is_finished = event
+            if item_id >= len(self.task_store):
+                self.task_store.add(url)
+            previous = latest.get(item_id)
+            latest[item_id] = (
+                status,
+                progress or (previous[1] if previous else ''),
+                filename or (previous[2] if previous else '')
+            )
+            if is_finished:
+                finished += 1
+
+        for item_id, (status, progress, filename) in latest.items():
+            self.task_store.update(item_id, status, progress, filename)
+        if latest:
+            self.task_view.refresh()
 
-        thread = threading.Thread(target=self._download_worker)
-        thread.daemon = True
-        thread.start()
+        if self.is_downloading:
+            self.finished_tasks += finished
+            if latest or self.engine.ingest_done != (str(self.overall_progress_bar['mode']) == 'determinate'):
+                self.update_overall_progress()
+
+        if batch_future is not None:
+            self.on_batch_done(batch_future)
+        if unfinished_future is not None:
+            self.on_unfinished(unfinished_future)
+
+    def update_overall_progress(self):
+        finished = self.engine.resumed_finished + self.finished_tasks
+        if not self.engine.ingest_done:
+            if str(self.overall_progress_bar['mode']) != 'indeterminate':
+                self.overall_progress_bar.config(mode='indeterminate')
+                self.overall_progress_bar.start(50)
+            self.status_label.config(text=f"下载中 (已完成 {finished}，正在读取地址...)", style='Info.TLabel')
+            return
+
+        self.reset_overall_progress()
+        total = max(self.engine.ingest.accepted, finished, 1)
+        self.overall_progress_var.set((finished / total) * 100)
+        self.status_label.config(text=f"下载中 ({finished}/{total})", style='Info.TLabel')
 
-    def _download_worker(self):
-        total_tasks = self.download_queue.qsize()
-        completed_tasks = 0
+    def reset_overall_progress(self):
+        if str(self.overall_progress_bar['mode']) != 'determinate':
+            self.overall_progress_bar.stop()
+            self.overall_progress_bar.config(mode='determinate')
 
+    def on_batch_done(self, future):
+        self.reset_overall_progress()
         try:
-            while not self.download_queue.empty():
-                if self.stop_event.is_set():
-                    break
-
-                url, item_id = self.download_queue.get()
-                self.current_task_index += 1
-
-                self.root.after(0, lambda: self.status_label.config(
-                    text=f"下载中 ({self.current_task_index}/{total_tasks})",
-                    style='Info.TLabel'
-                ))
-
-                save_path = self.save_path_var.get()
-                is_pdf = self.is_pdf_url(url)
-                filename = self.get_filename_from_url(url, is_pdf)
-                filepath = os.path.join(save_path, filename)
-
-                counter = 1
-                base_name = os.path.splitext(filename)[0]
-                ext = os.path.splitext(filename)[1]
-                while os.path.exists(filepath):
-                    filename = f"{base_name}_{counter}{ext}"
-                    filepath = os.path.join(save_path, filename)
-                    counter += 1
-
-                if is_pdf:
-                    success = self.download_pdf_direct(url, filepath, item_id)
-                else:
-                    result = self.convert_webpage_to_pdf(url, filepath, item_id)
-                    success = result is not None
-
-                if success:
-                    completed_tasks += 1
-
-                progress = (self.current_task_index / total_tasks) * 100
-                self.root.after(0, lambda p=progress: self.overall_progress_var.set(p))
-
-            if self.stop_event.is_set():
+            summary = future.result()
+            completed_tasks = summary['done']
+            total_tasks = summary['accepted']
+            if total_tasks:
+                self.overall_progress_var.set((summary['done'] + summary['failed']) / total_tasks * 100)
+
+            if self.engine.stop_event.is_set():
                 final_text = f"已停止 (完成 {completed_tasks}/{total_tasks})"
                 style = 'Warning.TLabel'
             else:
                 final_text = f"全部完成 ({completed_tasks}/{total_tasks})"
                 style = 'Success.TLabel'
+            if summary['duplicates']:
+                final_text += f"，跳过重复 {summary['duplicates']} 个"
 
-            self.root.after(0, lambda: self.status_label.config(text=final_text, style=style))
-
+            self.status_label.config(text=final_text, style=style)
         except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("错误", str(e)))
+            messagebox.showerror("错误", str(e))
         finally:
-            self.root.after(0, lambda: (
-                setattr(self, 'is_downloading', False),
-                self.download_btn.config(state='normal'),
-                self.stop_btn.config(state='disabled')
-            ))
+            self.is_downloading = False
+            self.download_btn.config(state='normal')
+            self.stop_btn.config(state='disabled')
 
 
 def main():
+    multiprocessing.freeze_support()
     try:
-        import requests
+        import aiohttp
         import playwright
     except ImportError:
-        print("请安装依赖: pip install requests playwright")
+        print("请安装依赖: pip install aiohttp playwright")
         print("然后运行: python -m playwright install chromium")
         return
 
     root = tk.Tk()
     app = PDFDownloaderGUI(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
 
     root.update_idletasks()
     w, h = root.winfo_width(), root.winfo_height()
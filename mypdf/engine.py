@@ -0,0 +1,1503 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import math
+import time
+import random
+import json
+import asyncio
+import hashlib
+import threading
+from itertools import islice
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse, unquote
+from datetime import datetime
+import aiohttp
+
+if __package__:
+    from .partfile import PartFile
+    from .classifier import UrlClassifier, sniff_kind, SNIFF_SIZE
+    from .manifest import Manifest, settings_hash
+    from .settle import SettleTracker, SETTLE_INIT_JS, wait_for_settle
+    from .resource_policy import ResourcePolicy, BlockStats
+    from .subresource_cache import SubresourceCache, CacheStats
+    from .ingest import UrlDedupe, IngestStats, iter_unique_urls, iter_sources
+    from .job_store import JobStore, FLUSH_INTERVAL
+    from .host_scheduler import HostScheduler, HostQueue, HostThrottled, THROTTLE_STATUSES, host_key
+    from .retry import RetryPolicy, RetryBudget, CircuitBreaker, HostUnavailable, RemoteError, classify_error
+    from .metrics import JobTrace, Metrics, MetricsServer
+    from .stream_writer import StreamWriter, StreamHash, BufferPool, fsync
+    from .postprocess import PostProcessor, pikepdf_available
+    from .print_stream import stream_pdf, print_options
+    from .html_render import HtmlRenderer, weasyprint_available, MAX_HTML_SIZE
+else:
+    from partfile import PartFile
+    from classifier import UrlClassifier, sniff_kind, SNIFF_SIZE
+    from manifest import Manifest, settings_hash
+    from settle import SettleTracker, SETTLE_INIT_JS, wait_for_settle
+    from resource_policy import ResourcePolicy, BlockStats
+    from subresource_cache import SubresourceCache, CacheStats
+    from ingest import UrlDedupe, IngestStats, iter_unique_urls, iter_sources
+    from job_store import JobStore, FLUSH_INTERVAL
+    from host_scheduler import HostScheduler, HostQueue, HostThrottled, THROTTLE_STATUSES, host_key
+    from retry import RetryPolicy, RetryBudget, CircuitBreaker, HostUnavailable, RemoteError, classify_error
+    from metrics import JobTrace, Metrics, MetricsServer
+    from stream_writer import StreamWriter, StreamHash, BufferPool, fsync
+    from postprocess import PostProcessor, pikepdf_available
+    from print_stream import stream_pdf, print_options
+    from html_render import HtmlRenderer, weasyprint_available, MAX_HTML_SIZE
+
+
+DEFAULT_CONFIG = {
+    'save_path': os.path.join(os.getcwd(), 'downloads'),
+    'wait_time': 3,
+    'page_size': 'A4',
+    'landscape': False,
+    'scale': 1.0,
+    'print_background': True,
+    'block_images': False,
+    'block_media': True,
+    'block_fonts': False,
+    'block_trackers': True,
+    'block_third_party_scripts': False,
+    'blocked_domains': [],
+    'allowed_domains': [],
+    'remove_popups': True,
+    'full_load': True,
+    'scroll_pause': 2,
+    'max_scroll_time': 60,
+    'stream_pdf': True,
+    'html_engine': 'auto',
+    'html_workers': 0,
+    'browser_pool_size': 1,
+    'max_pages_per_browser': 50,
+    'render_workers': 0,
+    'render_worker_max_rss_mb': 2048,
+    'direct_workers': 8,
+    'render_concurrency': 4,
+    'segments': 4,
+    'segment_min_size': 8 * 1024 * 1024,
+    'write_buffer_kb': 1024,
+    'fsync': 'none',
+    'fsync_interval_mb': 64,
+    'optimize_pdfs': 'none',
+    'linearize': True,
+    'postprocess_workers': 0,
+    'merge_output': '',
+    'preclassify': True,
+    'manifest': True,
+    'settle_quiet_ms': 500,
+    'subresource_cache': True,
+    'subresource_cache_dir': '',
+    'subresource_cache_size_mb': 512,
+    'ui_refresh_hz': 10,
+    'strip_query_params': ['utm_*', 'fbclid', 'gclid', 'msclkid'],
+    'dedupe_exact_limit': 1000000,
+    'ingest_window': 1000,
+    'job_store': True,
+    'job_lease': 60,
+    'cluster_token': '',
+    'worker_jobs': 8,
+    'per_host_connections': 4,
+    'per_host_rate': 5,
+    'per_host_burst': 10,
+    'max_retry_after': 300,
+    'throttle_retries': 3,
+    'retry_attempts': 3,
+    'retry_base_delay': 1.0,
+    'retry_max_delay': 30,
+    'retry_budget_ratio': 0.2,
+    'breaker_threshold': 5,
+    'breaker_cooldown': 60,
+    'trace_file': '',
+    'metrics_host': '127.0.0.1',
+    'metrics_port': 0
+}
+
+RENDER_SETTINGS = (
+    'wait_time', 'page_size', 'landscape', 'scale', 'print_background', 'block_images',
+    'block_media', 'block_fonts', 'block_trackers', 'block_third_party_scripts', 'blocked_domains',
+    'allowed_domains', 'remove_popups', 'full_load', 'scroll_pause', 'max_scroll_time', 'html_engine'
+)
+
+MANIFEST_NAME = '.mypdf_manifest.db'
+JOBS_NAME = '.mypdf_jobs.db'
+CACHE_DIR_NAME = '.mypdf_cache'
+INGEST_BATCH = 500
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36'
+]
+
+COOKIE_SELECTORS = [
+    'button:has-text("OK, Got it")',
+    'button:has-text("Accept")',
+    'button:has-text("Accept all")',
+    'button:has-text("I agree")',
+    'button:has-text("同意")',
+    '[aria-label*="accept"]',
+    '[aria-label*="Accept"]'
+]
+
+REMOVE_POPUPS_JS = """
+    () => {
+        const selectors = [
+            '.modal', '.popup', '.overlay', '.dialog', 
+            '[class*="modal"]', '[class*="popup"]', '[role="dialog"]',
+            '[class*="cookie"]', '[class*="consent"]', '[class*="gdpr"]',
+            '.alert', '.banner', '.notification',
+            'div[style*="position: fixed"]', 'div[style*="position:fixed"]'
+        ];
+
+        selectors.forEach(s => {
+            document.querySelectorAll(s).forEach(el => {
+                const style = getComputedStyle(el);
+                if (style.zIndex > 100 || style.position === 'fixed') {
+                    el.remove();
+                }
+            });
+        });
+
+        document.body.style.overflow = '';
+        document.documentElement.style.overflow = '';
+        document.body.classList.remove('modal-open', 'no-scroll');
+    }
+"""
+
+LAZY_LOAD_JS = """
+    () => {
+        const lazySelectors = [
+            'img[data-src]', 'img[data-lazy]', 'img[data-original]',
+            'img.lazy', 'img.lazyload', '[data-background-image]',
+            'img[loading="lazy"]', 'img[data-lazy-src]'
+        ];
+
+        lazySelectors.forEach(selector => {
+            document.querySelectorAll(selector).forEach(img => {
+                if (img.dataset.src) img.src = img.dataset.src;
+                if (img.dataset.lazySrc) img.src = img.dataset.lazySrc;
+                if (img.dataset.original) img.src = img.dataset.original;
+                if (img.dataset.backgroundImage) {
+                    img.style.backgroundImage = `url(${img.dataset.backgroundImage})`;
+                }
+                img.removeAttribute('loading');
+            });
+        });
+
+        window.dispatchEvent(new Event('scroll'));
+        window.dispatchEvent(new Event('resize'));
+    }
+"""
+
+
+class RangeNotSupported(Exception):
+    pass
+
+
+class NotPdf(Exception):
+    pass
+
+
+class NotModified(Exception):
+    pass
+
+
+def clean_title(title):
+    return re.sub(r'[<>:"/\\|?*]', '', title).strip()[:50] if title else None
+
+
+async def iter_body(response, head=b''):
+    if head:
+        yield head
+    async for chunk in response.content.iter_any():
+        yield chunk
+
+
+def get_random_user_agent():
+    return random.choice(USER_AGENTS)
+
+
+class DownloadJob:
+    def __init__(self, url, task_id=None):
+        self.url = url
+        self.task_id = task_id
+        self.state = 'pending'
+        self.status = '等待中'
+        self.progress = ''
+        self.filename = ''
+        self.filepath = None
+        self.is_pdf = None
+        self.error = None
+        self.total_size = 0
+        self.downloaded = 0
+        self.entry = None
+        self.source = {}
+        self.block_stats = None
+        self.cache_stats = None
+        self.unchanged = False
+        self.host_slot = False
+        self.attempts = 0
+        self.digest = None
+        self.optimized = None
+        self.renderer = None
+        self.record_id = None
+        self.trace = JobTrace()
+        self.future = None
+
+    @property
+    def finished(self):
+        return self.state in ('done', 'failed', 'stopped')
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'state': self.state,
+            'type': None if self.is_pdf is None else ('pdf' if self.is_pdf else 'webpage'),
+            'path': self.filepath if self.state == 'done' else None,
+            'unchanged': self.unchanged,
+            'blocked': self.block_stats.to_dict() if self.block_stats else None,
+            'cache': self.cache_stats.to_dict() if self.cache_stats else None,
+            'attempts': self.attempts + 1,
+            'optimized': self.optimized,
+            'renderer': self.renderer,
+            'error': self.error
+        }
+
+    def __await__(self):
+        return self.future.__await__()
+
+
+class DownloadEngine:
+    def __init__(self, config=None, on_update=None):
+        self.config = dict(DEFAULT_CONFIG)
+        self.config.update(config or {})
+        self.on_update = on_update
+        self.stop_event = threading.Event()
+        self.session = None
+        self.direct_lane = None
+        self.render_lane = None
+        self.reserved_paths = set()
+        self.classifier = UrlClassifier()
+        self.browser_pool = None
+        self.render_pool = None
+        self.warm_up_task = None
+        self.manifest = None
+        self.job_store = None
+        self.subresource_cache = None
+        self.hosts = HostScheduler()
+        self.breaker = CircuitBreaker()
+        self.retry_policy = None
+        self.retry_budget = None
+        self.metrics = Metrics()
+        self.metrics_server = None
+        self.trace_output = None
+        self.buffers = None
+        self.postprocessor = None
+        self.can_postprocess = pikepdf_available()
+        self.html_renderer = None
+        self.can_render_light = weasyprint_available()
+        self.bundle_jobs = None
+        self.ingest = IngestStats()
+        self.ingest_done = False
+        self.resumed_finished = 0
+        self.configure_hosts()
+
+    def get_browser_pool(self):
+        if self.browser_pool is None:
+            if __package__:
+                from .browser_pool import BrowserPool
+            else:
+                from browser_pool import BrowserPool
+
+            self.browser_pool = BrowserPool(
+                size=self.config['browser_pool_size'],
+                max_pages_per_browser=self.config['max_pages_per_browser'],
+                context_options=self.get_context_options
+            )
+        return self.browser_pool
+
+    def get_render_pool(self):
+        if self.render_pool is None:
+            if __package__:
+                from .render_worker import RenderPool
+            else:
+                from render_worker import RenderPool
+
+            self.render_pool = RenderPool(self.config['render_workers'], self.config['render_worker_max_rss_mb'])
+        return self.render_pool
+
+    def cache_dir(self):
+        return self.config['subresource_cache_dir'] or os.path.join(self.config['save_path'], CACHE_DIR_NAME)
+
+    def get_subresource_cache(self):
+        if self.subresource_cache is None and self.config['subresource_cache']:
+            self.subresource_cache = SubresourceCache(
+                self.cache_dir(), int(self.config['subresource_cache_size_mb']) * 1024 * 1024)
+        return self.subresource_cache
+
+    def get_postprocessor(self):
+        if self.postprocessor is None:
+            self.postprocessor = PostProcessor(int(self.config['postprocess_workers']))
+        return self.postprocessor
+
+    def get_html_renderer(self):
+        if self.html_renderer is None:
+            self.html_renderer = HtmlRenderer(int(self.config['html_workers']))
+        return self.html_renderer
+
+    def configure(self, config):
+        self.config.update(config)
+        if self.browser_pool is not None:
+            self.browser_pool.resize(self.config['browser_pool_size'])
+            self.browser_pool.max_pages_per_browser = max(1, int(self.config['max_pages_per_browser']))
+        if self.render_pool is not None:
+            self.render_pool.configure(self.config['render_workers'], self.config['render_worker_max_rss_mb'])
+        self.direct_lane = None
+        self.render_lane = None
+        self.configure_hosts()
+
+    def configure_hosts(self):
+        self.hosts.configure(
+            max_per_host=self.config['per_host_connections'],
+            rate=self.config['per_host_rate'],
+            burst=self.config['per_host_burst'],
+            max_retry_after=self.config['max_retry_after']
+        )
+        self.breaker.threshold = max(1, int(self.config['breaker_threshold']))
+        self.breaker.cooldown = float(self.config['breaker_cooldown'])
+        self.retry_policy = RetryPolicy(
+            self.config['retry_attempts'], self.config['retry_base_delay'], self.config['retry_max_delay']
+        )
+        self.buffers = BufferPool(int(self.config['write_buffer_kb']) * 1024)
+
+    async def start(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=0)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=30),
+                headers={
+                    'User-Agent': get_random_user_agent(),
+                    'Accept': '*/*',
+                    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+                    'Accept-Encoding': 'gzip, deflate, br',
+                    'Connection': 'keep-alive'
+                }
+            )
+        if self.direct_lane is None:
+            self.direct_lane = asyncio.Semaphore(max(1, int(self.config['direct_workers'])))
+        if self.render_lane is None:
+            self.render_lane = asyncio.Semaphore(max(1, int(self.config['render_concurrency'])))
+
+        manifest_path = os.path.join(self.config['save_path'], MANIFEST_NAME)
+        if self.manifest is not None and (not self.config['manifest'] or self.manifest.path != manifest_path):
+            self.manifest.close()
+            self.manifest = None
+        if self.manifest is None and self.config['manifest']:
+            os.makedirs(self.config['save_path'], exist_ok=True)
+            self.manifest = Manifest(manifest_path)
+
+        jobs_path = os.path.join(self.config['save_path'], JOBS_NAME)
+        if self.job_store is not None and (not self.config['job_store'] or self.job_store.path != jobs_path):
+            self.job_store.close()
+            self.job_store = None
+        if self.job_store is None and self.config['job_store']:
+            os.makedirs(self.config['save_path'], exist_ok=True)
+            self.job_store = JobStore(jobs_path)
+
+        if self.subresource_cache is not None and (not self.config['subresource_cache']
+                                                   or self.subresource_cache.directory != self.cache_dir()):
+            self.subresource_cache.close()
+            self.subresource_cache = None
+        elif self.subresource_cache is not None:
+            self.subresource_cache.max_bytes = int(self.config['subresource_cache_size_mb']) * 1024 * 1024
+
+        trace_file = self.config['trace_file']
+        if self.trace_output is not None and self.trace_output.name != trace_file:
+            self.trace_output.close()
+            self.trace_output = None
+        if self.trace_output is None and trace_file:
+            self.trace_output = open(trace_file, 'a', encoding='utf-8')
+
+        if self.metrics_server is None and int(self.config['metrics_port']):
+            self.metrics_server = MetricsServer(self.metrics, self.config['metrics_host'], int(self.config['metrics_port']))
+            await self.metrics_server.start()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        if self.browser_pool is not None:
+            await self.browser_pool.close()
+        if self.render_pool is not None:
+            await self.render_pool.close()
+            self.render_pool = None
+        if self.manifest is not None:
+            self.manifest.close()
+            self.manifest = None
+        if self.job_store is not None:
+            self.job_store.close()
+            self.job_store = None
+        if self.subresource_cache is not None:
+            self.subresource_cache.close()
+            self.subresource_cache = None
+        if self.trace_output is not None:
+            self.trace_output.close()
+            self.trace_output = None
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+            self.metrics_server = None
+        if self.postprocessor is not None:
+            self.postprocessor.close()
+            self.postprocessor = None
+        if self.html_renderer is not None:
+            self.html_renderer.close()
+            self.html_renderer = None
+
+    def stop(self):
+        self.stop_event.set()
+
+    async def sleep(self, delay):
+        end = time.monotonic() + delay
+        while not self.stop_event.is_set():
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(remaining, 0.5))
+
+    def get_context_options(self):
+        return {
+            'viewport': {'width': 1920, 'height': 1080},
+            'user_agent': get_random_user_agent(),
+            'bypass_csp': True,
+            'ignore_https_errors': True,
+            'locale': 'zh-CN',
+            'storage_state': {
+                'cookies': [
+                    {
+                        'name': 'CONSENT',
+                        'value': 'YES+',
+                        'domain': '.kaggle.com',
+                        'path': '/'
+                    },
+                    {
+                        'name': 'kaggle_cookie_consent',
+                        'value': 'accepted',
+                        'domain': '.kaggle.com',
+                        'path': '/'
+                    }
+                ]
+            }
+        }
+
+    def update_job(self, job, status, progress='', filename='', state=None):
+        job.status = status
+        if progress:
+            job.progress = progress
+        if filename:
+            job.filename = filename
+        if state:
+            job.state = state
+
+        if self.on_update:
+            self.on_update(job)
+
+    def wants_optimize(self, job):
+        mode = self.config['optimize_pdfs']
+        return self.can_postprocess and (mode == 'all' or (mode == 'webpage' and job.is_pdf is False))
+
+    def complete_job(self, job):
+        filename = os.path.basename(job.filepath)
+        if self.wants_optimize(job):
+            self.update_job(job, '等待优化', '100%', filename, state='optimizing')
+        else:
+            self.update_job(job, '完成', '100%', filename, state='done')
+
+    async def optimize_job(self, job):
+        if not self.stop_event.is_set():
+            self.update_job(job, '优化中')
+            try:
+                with job.trace.span('optimize'):
+                    job.optimized = await self.get_postprocessor().optimize(job.filepath, bool(self.config['linearize']))
+            except Exception as e:
+                job.optimized = {'error': str(e)}
+            else:
+                await self.record_optimized(job)
+        self.update_job(job, '完成', '100%', state='done')
+
+    async def record_optimized(self, job):
+        if self.manifest is None:
+            return
+        fields = {'size': os.path.getsize(job.filepath)}
+        if job.is_pdf:
+            loop = asyncio.get_running_loop()
+            fields['content_hash'] = await loop.run_in_executor(None, StreamHash().finish, job.filepath)
+        self.manifest.record(job.url, **fields)
+
+    async def merge_bundle(self):
+        jobs, self.bundle_jobs = self.bundle_jobs, None
+        if not jobs or not self.can_postprocess or self.stop_event.is_set():
+            return None
+
+        paths = [job.filepath for job in jobs if job.state == 'done' and job.filepath]
+        if not paths:
+            return None
+
+        output = os.path.join(self.config['save_path'], self.config['merge_output'])
+        try:
+            result = await self.get_postprocessor().merge(paths, output, bool(self.config['linearize']))
+        except Exception as e:
+            return {'path': output, 'error': str(e)}
+        result['path'] = output
+        return result
+
+    def fail_job(self, job, error):
+        job.error = str(error)
+        self.update_job(job, f'失败: {str(error)}', state='failed')
+
+    def submit(self, url, task_id=None):
+        if not url.startswith(('http://', 'https://')):
+            url = 'https://' + url
+
+        job = DownloadJob(url, task_id)
+        self.metrics.add('mypdf_jobs_in_flight', 1)
+        if self.bundle_jobs is not None:
+            self.bundle_jobs.append(job)
+        job.future = asyncio.ensure_future(self.process_job(job))
+        return job
+
+    def finish_job(self, job):
+        self.metrics.add('mypdf_jobs_in_flight', -1)
+        self.metrics.record_job(job)
+        if self.trace_output is not None:
+            record = job.to_dict()
+            record.update(job.trace.to_dict())
+            self.trace_output.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.trace_output.flush()
+
+    @asynccontextmanager
+    async def lane(self, job, name):
+        start = time.monotonic()
+        async with (self.direct_lane if name == 'direct' else self.render_lane):
+            job.trace.mark(f'{name}_wait', start)
+            self.metrics.add('mypdf_lane_active', 1, lane=name)
+            try:
+                yield
+            finally:
+                self.metrics.add('mypdf_lane_active', -1, lane=name)
+
+    async def run(self, url, task_id=None):
+        return await self.submit(url, task_id)
+
+    async def run_batch(self, urls, task_ids=None):
+        self.stop_event.clear()
+        self.reserved_paths.clear()
+        self.retry_budget = RetryBudget(self.config['retry_budget_ratio'])
+        self.bundle_jobs = [] if self.config['merge_output'] else None
+        await self.start()
+
+        task_ids = task_ids or [None] * len(urls)
+        urls = [url if url.startswith(('http://', 'https://')) else 'https://' + url for url in urls]
+        if self.config['preclassify']:
+            await self.preclassify(urls)
+
+        jobs = [self.submit(url, task_id) for url, task_id in zip(urls, task_ids)]
+        await asyncio.gather(*[job.future for job in jobs])
+        await self.merge_bundle()
+        return jobs
+
+    async def run_stream(self, lines=None, sources=None, resume=None):
+        self.stop_event.clear()
+        self.reserved_paths.clear()
+        self.retry_budget = RetryBudget(self.config['retry_budget_ratio'])
+        self.bundle_jobs = [] if self.config['merge_output'] else None
+        await self.start()
+
+        store = self.job_store
+        ingest = IngestStats()
+        ingested = False
+        if resume is not None:
+            batch = store.batch(resume) if store is not None else None
+            if batch is None:
+                raise ValueError(f'找不到未完成的任务批次: {resume}')
+            ingest = IngestStats(**batch['stats'])
+            sources = batch['sources']
+            ingested = bool(batch['ingested']) or sources is None
+            lines = iter_sources([] if ingested else sources, ingest.lines)
+            store.recover(resume)
+            batch_id = resume
+            previous = store.counts(resume)
+            self.resumed_finished = previous['done'] + previous['failed']
+        else:
+            if lines is None:
+                lines = iter_sources(sources or [])
+            batch_id = store.create_batch(sources)['id'] if store is not None else None
+            self.resumed_finished = 0
+        self.ingest = ingest
+        self.ingest_done = ingested
+
+        loop = asyncio.get_running_loop()
+        window = max(1, int(self.config['ingest_window']))
+        lease = max(1.0, float(self.config['job_lease']))
+        counts = {'done': 0, 'failed': 0, 'stopped': 0}
+        urls = iter_unique_urls(lines, self.config['strip_query_params'],
+                                UrlDedupe(int(self.config['dedupe_exact_limit'])), ingest)
+        queue = HostQueue()
+        pending = set()
+        index = 0
+        exhausted = False
+        reclaim_at = None
+        renewed = time.monotonic()
+        released = self.hosts.watch()
+
+        async def read():
+            return await loop.run_in_executor(None, lambda: list(islice(urls, INGEST_BATCH)))
+
+        try:
+            while True:
+                while not exhausted and len(queue) < window and not self.stop_event.is_set():
+                    if store is None:
+                        items = [(None, url) for url in await read()]
+                        ingested = not items
+                        self.ingest_done = ingested
+                    else:
+                        items = store.claim(batch_id, min(INGEST_BATCH, window - len(queue)), lease)
+                        if not items and not ingested:
+                            chunk = await read()
+                            ingested = not chunk
+                            store.add(batch_id, chunk, ingest, ingested)
+                            self.ingest_done = ingested
+                            continue
+                        if not items:
+                            reclaim_at = store.leased_elsewhere(batch_id)
+                    exhausted = not items
+                    if items and self.config['preclassify']:
+                        await self.preclassify([url for _, url in items])
+                    for item in items:
+                        queue.push(host_key(item[1]), item)
+
+                if self.stop_event.is_set():
+                    counts['stopped'] += queue.clear()
+                    reclaim_at = None
+                elif reclaim_at is not None and time.time() >= reclaim_at:
+                    exhausted = False
+                    reclaim_at = None
+                    continue
+
+                released.clear()
+                while len(pending) < window:
+                    item = queue.pop_ready(self.hosts.try_acquire)
+                    if item is None:
+                        break
+                    job = self.submit(item[1], index)
+                    job.record_id = item[0]
+                    job.host_slot = True
+                    index += 1
+                    self.update_job(job, '等待中')
+                    pending.add(job.future)
+
+                self.metrics.set('mypdf_queue_depth', len(queue))
+                if not pending and not len(queue) and reclaim_at is None:
+                    break
+
+                timeout = None
+                delays = [delay for delay in map(self.hosts.blocked_for, queue.order) if delay > 0]
+                if delays:
+                    timeout = min(delays)
+                if store is not None:
+                    if time.monotonic() - renewed >= lease / 3:
+                        store.renew(lease)
+                        renewed = time.monotonic()
+                    timeout = min(timeout or lease / 3, lease / 3)
+                    if store.unflushed:
+                        timeout = min(timeout, FLUSH_INTERVAL)
+                    if reclaim_at is not None:
+                        timeout = min(timeout, max(0.05, reclaim_at - time.time()))
+                waiter = asyncio.ensure_future(released.wait())
+                done, pending = await asyncio.wait(pending | {waiter}, timeout=timeout,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                done.discard(waiter)
+                pending.discard(waiter)
+                for future in done:
+                    job = future.result()
+                    state = job.state if job.finished else 'failed'
+                    counts[state] += 1
+                    if store is not None:
+                        store.finish(job.record_id, state, job.attempts, job.to_dict(), job.error)
+                if store is not None:
+                    store.flush(force=False)
+        finally:
+            self.hosts.released = None
+            if store is not None:
+                store.release(batch_id)
+
+        summary = ingest.to_dict()
+        summary.update(counts)
+        if store is not None:
+            state_counts = store.counts(batch_id)
+            remaining = state_counts['pending'] + state_counts['running']
+            summary.update(done=state_counts['done'], failed=state_counts['failed'], stopped=remaining,
+                           batch=batch_id)
+            if ingested and not remaining:
+                store.close_batch(batch_id)
+        summary['bundle'] = await self.merge_bundle()
+        return summary
+
+    async def unfinished_batch(self):
+        await self.start()
+        return self.job_store.unfinished() if self.job_store is not None else None
+
+    async def discard_batch(self, batch_id):
+        await self.start()
+        if self.job_store is not None:
+            self.job_store.close_batch(batch_id, 'cancelled')
+
+    async def process_job(self, job):
+        try:
+            await self.fetch_job(job)
+            if job.state == 'optimizing':
+                await self.optimize_job(job)
+        finally:
+            self.finish_job(job)
+        return job
+
+    async def fetch_job(self, job):
+        await self.start()
+
+        host = host_key(job.url)
+        if not job.host_slot:
+            with job.trace.span('host_wait'):
+                await self.hosts.acquire(host)
+            job.host_slot = True
+
+        if self.retry_budget is None:
+            self.retry_budget = RetryBudget(self.config['retry_budget_ratio'])
+        self.retry_budget.deposit()
+
+        throttles = 0
+        try:
+            while True:
+                try:
+                    self.breaker.check(host)
+                    await self.run_job(job)
+                    if job.state == 'stopped':
+                        self.breaker.release(host)
+                    else:
+                        self.breaker.success(host)
+                    return job
+                except Exception as e:
+                    kind = classify_error(e)
+                    self.reserved_paths.discard(job.filepath)
+                    job.filepath = None
+                    job.is_pdf = None
+
+                    if kind == 'throttle':
+                        self.breaker.release(host)
+                        throttles += 1
+                        if throttles > int(self.config['throttle_retries']) or self.stop_event.is_set():
+                            self.fail_job(job, e)
+                            return job
+                        self.update_job(job, f'限流等待 {e.delay:.0f} 秒')
+                        with job.trace.span('throttle'):
+                            await self.hosts.wait_turn(host, self.stop_event)
+                        continue
+
+                    if kind == 'retryable':
+                        self.breaker.failure(host)
+                    elif isinstance(e, aiohttp.ClientResponseError):
+                        self.breaker.success(host)
+                    elif not isinstance(e, HostUnavailable):
+                        self.breaker.release(host)
+
+                    if (kind != 'retryable' or job.attempts >= self.retry_policy.attempts
+                            or self.stop_event.is_set() or not self.retry_budget.withdraw()):
+                        self.fail_job(job, e)
+                        return job
+
+                    job.attempts += 1
+                    delay = self.retry_policy.delay(job.attempts - 1)
+                    self.update_job(job, f'重试 {job.attempts}/{self.retry_policy.attempts}（{delay:.0f} 秒后）')
+                    with job.trace.span('backoff'):
+                        await self.sleep(delay)
+        finally:
+            self.hosts.release(host)
+            job.host_slot = False
+
+    async def run_job(self, job):
+        async with self.lane(job, 'direct'):
+            if self.stop_event.is_set():
+                self.update_job(job, '已停止', state='stopped')
+                return job
+
+            job.state = 'running'
+            save_path = self.config['save_path']
+            os.makedirs(save_path, exist_ok=True)
+
+            job.entry = self.get_manifest_entry(job.url)
+
+            if not job.entry or job.entry['kind'] != 'webpage':
+                job.filepath = self.reserve_output(save_path, job, True)
+                with job.trace.span('download'):
+                    await self.download_pdf_direct(job)
+                if job.is_pdf is not False:
+                    return job
+                self.reserved_paths.discard(job.filepath)
+
+            job.is_pdf = False
+            job.filepath = self.reserve_output(save_path, job, False)
+
+            with job.trace.span('revalidate'):
+                unchanged = await self.webpage_unchanged(job)
+            if unchanged:
+                self.mark_unchanged(job)
+                return job
+
+        async with self.lane(job, 'render'):
+            if self.stop_event.is_set():
+                self.update_job(job, '已停止', state='stopped')
+                return job
+
+            await self.convert_webpage_to_pdf(job)
+
+        return job
+
+    @asynccontextmanager
+    async def request(self, url, headers=None, job=None):
+        host = host_key(url)
+        await self.hosts.wait_turn(host, self.stop_event)
+        if job is not None:
+            job.trace.requests += 1
+        async with self.session.get(url, headers=headers) as response:
+            if response.status == 429 or (response.status in THROTTLE_STATUSES and 'Retry-After' in response.headers):
+                raise HostThrottled(url, self.hosts.defer(host, response.headers.get('Retry-After')))
+            yield response
+
+    def get_manifest_entry(self, url):
+        if self.manifest is None:
+            return None
+        entry = self.manifest.get(url)
+        if entry and entry['path'] and os.path.exists(entry['path']):
+            return entry
+        return None
+
+    def reserve_output(self, save_path, job, is_pdf):
+        if job.entry:
+            self.reserved_paths.add(job.entry['path'])
+            return job.entry['path']
+        return self.reserve_filepath(save_path, self.get_filename_from_url(job.url, is_pdf), job.url)
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def mark_unchanged(self, job):
+        job.unchanged = True
+        self.update_job(job, '未变化', '100%', os.path.basename(job.filepath), state='done')
+
+    async def webpage_unchanged(self, job):
+        entry = job.entry
+        if not entry or entry['kind'] != 'webpage':
+            return False
+        if entry['settings_hash'] != settings_hash(self.config, RENDER_SETTINGS):
+            return False
+
+        try:
+            async with self.request(job.url, headers=self.conditional_headers(entry), job=job) as response:
+                if response.status == 304:
+                    return True
+                if response.status >= 400 or not entry['source_hash']:
+                    return False
+                body = await response.read()
+                return hashlib.sha256(body).hexdigest() == entry['source_hash']
+        except HostThrottled:
+            raise
+        except Exception:
+            return False
+
+    async def record_download(self, job, part):
+        if self.manifest is None:
+            return
+        loop = asyncio.get_running_loop()
+        content_hash = await loop.run_in_executor(None, job.digest.finish, job.filepath)
+        self.manifest.record(
+            job.url,
+            kind='pdf',
+            etag=part.meta.get('etag', ''),
+            last_modified=part.meta.get('last_modified', ''),
+            content_hash=content_hash,
+            path=job.filepath,
+            size=os.path.getsize(job.filepath)
+        )
+
+    def record_render(self, job):
+        if self.manifest is None:
+            return
+        self.manifest.record(
+            job.url,
+            kind='webpage',
+            etag=job.source.get('etag', ''),
+            last_modified=job.source.get('last_modified', ''),
+            source_hash=job.source.get('source_hash', ''),
+            path=job.filepath,
+            settings_hash=settings_hash(self.config, RENDER_SETTINGS),
+            size=os.path.getsize(job.filepath)
+        )
+
+    async def read_head(self, response):
+        head = b''
+        while len(head) < SNIFF_SIZE:
+            chunk = await response.content.read(SNIFF_SIZE - len(head))
+            if not chunk:
+                break
+            head += chunk
+        return head
+
+    async def sniff_response(self, job, response):
+        if response.status == 304:
+            raise NotModified(job.url)
+        if response.status >= 400:
+            if response.status < 500 and job.is_pdf is None and not urlparse(job.url).path.lower().endswith('.pdf'):
+                job.is_pdf = False
+                raise NotPdf(job.url)
+            response.raise_for_status()
+
+        if job.is_pdf is not None:
+            return b''
+
+        head = await self.read_head(response)
+        kind = sniff_kind(response.headers.get('Content-Type', ''), head)
+        self.classifier.record(job.url, kind)
+
+        job.is_pdf = kind == 'pdf'
+        if not job.is_pdf:
+            raise NotPdf(job.url)
+        return head
+
+    async def classify_url(self, url):
+        try:
+            async with self.request(url) as response:
+                if response.status >= 400:
+                    return None
+                kind = sniff_kind(response.headers.get('Content-Type', ''), await self.read_head(response))
+                self.classifier.record(url, kind)
+                return kind
+        except Exception:
+            return None
+
+    async def preclassify(self, urls):
+        groups = self.classifier.unknown_groups(urls)
+
+        async def probe(url):
+            async with self.direct_lane:
+                if not self.stop_event.is_set():
+                    await self.classify_url(url)
+
+        await asyncio.gather(*[probe(group[0]) for group in groups.values() if len(group) > 1])
+
+        if any(self.classifier.lookup(url) == 'webpage' for url in urls):
+            self.warm_up_task = asyncio.ensure_future(self.warm_up_browsers())
+
+    async def warm_up_browsers(self):
+        try:
+            if int(self.config['render_workers']) > 0:
+                await self.get_render_pool().warm_up()
+            else:
+                await self.get_browser_pool().warm_up()
+        except Exception:
+            pass
+
+    def get_filename_from_url(self, url, is_pdf=True):
+        parsed = urlparse(url)
+        filename = os.path.basename(unquote(parsed.path))
+
+        if not is_pdf:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            filename = f"webpage_{timestamp}.pdf"
+        elif not filename or not filename.endswith('.pdf'):
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"download_{timestamp}.pdf"
+
+        return filename
+
+    def is_path_taken(self, filepath, url=None):
+        if filepath in self.reserved_paths or os.path.exists(filepath):
+            return True
+        owner = PartFile.owner(filepath)
+        return owner is not None and owner != url
+
+    def reserve_filepath(self, save_path, filename, url=None):
+        base_name, ext = os.path.splitext(filename)
+        filepath = os.path.join(save_path, filename)
+        counter = 1
+
+        while self.is_path_taken(filepath, url):
+            filepath = os.path.join(save_path, f"{base_name}_{counter}{ext}")
+            counter += 1
+        self.reserved_paths.add(filepath)
+
+        return filepath
+
+    async def download_pdf_direct(self, job):
+        part = PartFile(job.filepath, job.url)
+        job.digest = StreamHash()
+        try:
+            self.update_job(job, '下载中')
+
+            completed = None
+            if part.load():
+                job.is_pdf = True
+                completed = await self.resume_download(job, part)
+            if completed is None:
+                completed = await self.fresh_download(job, part)
+
+            if not completed:
+                part.save(force=True)
+                self.update_job(job, '已停止', state='stopped')
+                return False
+
+            part.commit()
+            await self.record_download(job, part)
+            self.complete_job(job)
+            return True
+        except NotModified:
+            job.is_pdf = True
+            self.mark_unchanged(job)
+            return True
+        except NotPdf:
+            part.discard()
+            return False
+        except Exception:
+            part.save(force=True)
+            raise
+
+    def report_progress(self, job):
+        if job.total_size > 0:
+            progress = (job.downloaded / job.total_size) * 100
+            self.update_job(job, '下载中', f"{progress:.1f}%")
+
+    def supports_segments(self, response, total_size):
+        return (
+            int(self.config['segments']) > 1
+            and total_size >= int(self.config['segment_min_size'])
+            and response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+            and not response.headers.get('Content-Encoding')
+        )
+
+    def split_ranges(self, total_size):
+        count = min(int(self.config['segments']), max(1, total_size // (256 * 1024)))
+        size = -(-total_size // count)
+        return [(start, min(start + size, total_size) - 1) for start in range(0, total_size, size)]
+
+    async def fresh_download(self, job, part):
+        headers = {}
+        if job.entry and job.entry['kind'] == 'pdf':
+            headers = self.conditional_headers(job.entry)
+
+        async with self.request(job.url, headers=headers, job=job) as response:
+            head = await self.sniff_response(job, response)
+
+            total_size = response.content_length or 0
+            job.total_size = total_size
+            job.downloaded = 0
+
+            if self.supports_segments(response, total_size):
+                part.reset(response.headers, total_size, self.split_ranges(total_size))
+                try:
+                    return await self.download_segments(job, part, fresh=True, response=response, head=head)
+                except RangeNotSupported:
+                    pass
+            else:
+                part.reset(response.headers, total_size, [(0, total_size - 1 if total_size else None)])
+                return await self.download_segments(job, part, fresh=True, response=response, head=head)
+
+        async with self.request(job.url, job=job) as response:
+            response.raise_for_status()
+            job.downloaded = 0
+            part.reset(response.headers, total_size, [(0, total_size - 1 if total_size else None)])
+            return await self.download_segments(job, part, fresh=True, response=response)
+
+    async def resume_download(self, job, part):
+        if not part.validator():
+            return None
+
+        job.total_size = part.total_size
+        job.downloaded = part.downloaded()
+        self.update_job(job, '续传中')
+
+        try:
+            return await self.download_segments(job, part, fresh=False)
+        except RangeNotSupported:
+            job.downloaded = 0
+            return None
+
+    def sync_interval(self):
+        if self.config['fsync'] != 'periodic':
+            return 0
+        return max(1, int(self.config['fsync_interval_mb'])) * 1024 * 1024
+
+    async def download_segments(self, job, part, fresh, response=None, head=b''):
+        validator = part.validator()
+        if fresh:
+            job.digest.reset()
+
+        with part.open(fresh) as f:
+            fd = f.fileno()
+
+            tasks = [
+                asyncio.ensure_future(self.fetch_segment(job, part, fd, seg, validator,
+                                                         response if fresh and i == 0 else None, head))
+                for i, seg in enumerate(part.pending())
+            ]
+            try:
+                results = await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+
+            if all(results) and part.segments[-1][1] is None:
+                os.ftruncate(fd, part.segments[-1][2])
+            if all(results) and self.config['fsync'] != 'none':
+                await asyncio.get_running_loop().run_in_executor(None, fsync, fd)
+
+        return all(results)
+
+    async def fetch_segment(self, job, part, fd, seg, validator, response=None, head=b''):
+        if response is not None:
+            return await self.write_segment(job, part, fd, response, seg, head)
+
+        start, end, offset = seg
+        headers = {'Range': f'bytes={offset}-{"" if end is None else end}'}
+        if validator:
+            headers['If-Range'] = validator
+
+        async with self.request(job.url, headers=headers, job=job) as response:
+            response.raise_for_status()
+            content_range = response.headers.get('Content-Range', '')
+            if response.status != 206 or not content_range.startswith(f'bytes {offset}-'):
+                raise RangeNotSupported(job.url)
+            return await self.write_segment(job, part, fd, response, seg)
+
+    def advance(self, job, part, seg, size):
+        if not size:
+            return
+        seg[2] += size
+        job.downloaded += size
+        job.trace.bytes += size
+        part.save()
+        self.report_progress(job)
+
+    async def write_segment(self, job, part, fd, response, seg, head=b''):
+        end = seg[1]
+        writer = StreamWriter(fd, seg[2], self.buffers.acquire(), job.digest, self.sync_interval())
+        try:
+            async for chunk in iter_body(response, head):
+                if self.stop_event.is_set():
+                    return False
+
+                if end is not None:
+                    chunk = memoryview(chunk)[:end + 1 - writer.position]
+                self.advance(job, part, seg, writer.write(chunk))
+
+                if writer.sync_due():
+                    await asyncio.get_running_loop().run_in_executor(None, writer.sync)
+                    part.save(force=True)
+                if end is not None and writer.position > end:
+                    return True
+        finally:
+            self.advance(job, part, seg, writer.flush())
+            self.buffers.release(writer.buffer)
+
+        if end is None:
+            return True
+        raise aiohttp.ClientPayloadError(f'分段下载不完整: bytes {seg[0]}-{end}')
+
+    async def convert_webpage_to_pdf(self, job):
+        result = None
+        if self.can_render_light and self.config['html_engine'] == 'auto':
+            result = await self.render_light(job)
+            if job.state == 'stopped':
+                return None
+
+        if result is not None:
+            title = clean_title(result['title'])
+        else:
+            self.update_job(job, '等待浏览器')
+            job.renderer = 'chromium'
+            if int(self.config['render_workers']) > 0:
+                title = await self.render_remote(job)
+            else:
+                title = await self.render_local(job)
+            if job.state == 'stopped':
+                return None
+
+        tmp_path = job.filepath + '.part'
+        if title:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            self.reserved_paths.discard(job.filepath)
+            job.filepath = self.reserve_filepath(os.path.dirname(job.filepath), f"{title}_{timestamp}.pdf")
+        os.replace(tmp_path, job.filepath)
+        self.record_render(job)
+
+        self.complete_job(job)
+        return job.filepath
+
+    async def render_light(self, job):
+        self.update_job(job, '获取网页')
+        start = time.monotonic()
+        body = bytearray()
+        try:
+            async with self.request(job.url, job=job) as response:
+                content_type = response.headers.get('Content-Type', '').lower()
+                if response.status >= 400 or (content_type and 'html' not in content_type):
+                    return None
+                async for chunk in response.content.iter_any():
+                    body += chunk
+                    if len(body) > MAX_HTML_SIZE:
+                        return None
+                base_url = str(response.url)
+                encoding = response.charset
+                source = {
+                    'etag': response.headers.get('ETag', ''),
+                    'last_modified': response.headers.get('Last-Modified', '')
+                }
+        except HostThrottled:
+            raise
+        except Exception:
+            return None
+        finally:
+            job.trace.bytes += len(body)
+            job.trace.mark('fetch_html', start)
+
+        if self.stop_event.is_set():
+            self.update_job(job, '已停止', state='stopped')
+            return None
+
+        self.update_job(job, '生成PDF')
+        start = time.monotonic()
+        body = bytes(body)
+        try:
+            result = await self.get_html_renderer().render(
+                body, base_url, job.filepath + '.part', self.config, encoding, not job.entry)
+        except Exception:
+            result = {}
+        job.trace.mark('light_pdf', start)
+
+        if result.get('unavailable'):
+            self.can_render_light = False
+        if 'title' not in result:
+            return None
+        source['source_hash'] = hashlib.sha256(body).hexdigest()
+        job.source = source
+        job.block_stats = result['blocked']
+        job.renderer = 'weasyprint'
+        return result
+
+    async def render_local(self, job):
+        start = time.monotonic()
+        async with self.get_browser_pool().page() as page:
+            job.trace.mark('browser', start)
+            self.track_render_traffic(page, job)
+            return await self.render_page(page, job)
+
+    async def render_remote(self, job):
+        start = time.monotonic()
+        async with self.get_render_pool().worker() as worker:
+            job.trace.mark('browser', start)
+            await self.hosts.wait_turn(host_key(job.url), self.stop_event)
+            dispatched = time.monotonic()
+            result = await worker.render(job, self.config, self.stop_event, lambda status: self.update_job(job, status))
+
+        job.source = result['source']
+        job.block_stats = result['blocked']
+        job.cache_stats = result['cache']
+        job.trace.requests += result['requests']
+        job.trace.bytes += result['bytes']
+        offset = dispatched - job.trace.started
+        job.trace.spans.extend((stage, offset + at, duration) for stage, at, duration in result['spans'])
+
+        if 'error' in result:
+            if result['kind'] == 'throttle':
+                raise HostThrottled(job.url, self.hosts.defer(host_key(job.url), str(math.ceil(result['delay']))))
+            raise RemoteError(result['error'], result['kind'])
+        if result['stopped']:
+            self.update_job(job, '已停止', state='stopped')
+        return result['title']
+
+    def track_render_traffic(self, page, job):
+        def on_response(response):
+            job.trace.requests += 1
+            length = response.headers.get('content-length', '')
+            if length.isdigit():
+                job.trace.bytes += int(length)
+
+        page.on('response', on_response)
+
+    async def render_page(self, page, job):
+        config = self.config
+        page.set_default_timeout(60000)
+
+        policy = ResourcePolicy(config)
+        job.block_stats = BlockStats()
+        cache = self.get_subresource_cache()
+        fallback = None
+        if cache is not None:
+            job.cache_stats = CacheStats()
+            fallback = lambda route: cache.handle(route, job.cache_stats)
+        if policy.enabled or fallback is not None:
+            await page.route("**/*", policy.route_handler(job.url, job.block_stats, fallback))
+
+        await page.add_init_script(SETTLE_INIT_JS)
+        tracker = SettleTracker(page)
+        quiet = config['settle_quiet_ms'] / 1000
+
+        self.update_job(job, '加载页面')
+
+        host = host_key(job.url)
+        start = time.monotonic()
+        await self.hosts.wait_turn(host, self.stop_event)
+        response = await page.goto(job.url, wait_until='domcontentloaded', timeout=45000)
+        if response is not None and (response.status == 429 or (
+                response.status in THROTTLE_STATUSES and 'retry-after' in response.headers)):
+            raise HostThrottled(job.url, self.hosts.defer(host, response.headers.get('retry-after')))
+        if response is not None:
+            try:
+                job.source = {
+                    'etag': response.headers.get('etag', ''),
+                    'last_modified': response.headers.get('last-modified', ''),
+                    'source_hash': hashlib.sha256(await response.body()).hexdigest()
+                }
+            except Exception:
+                job.source = {}
+        job.trace.mark('goto', start)
+
+        if config['remove_popups']:
+            start = time.monotonic()
+            try:
+                await wait_for_settle(page, tracker, 1, quiet, self.stop_event)
+                for selector in COOKIE_SELECTORS:
+                    try:
+                        btn = await page.query_selector(selector)
+                        if btn and await btn.is_visible():
+                            await btn.click()
+                            await page.wait_for_timeout(500)
+                            break
+                    except Exception:
+                        continue
+            except Exception:
+                pass
+            job.trace.mark('cookie_popups', start)
+
+        start = time.monotonic()
+        await page.wait_for_load_state('load', timeout=30000)
+        job.trace.mark('load', start)
+
+        wait_time = int(config['wait_time'])
+        if wait_time > 0:
+            self.update_job(job, f'等待稳定(≤{wait_time}秒)')
+            start = time.monotonic()
+            await wait_for_settle(page, tracker, wait_time, quiet, self.stop_event)
+            job.trace.mark('settle', start)
+            if self.stop_event.is_set():
+                self.update_job(job, '已停止', state='stopped')
+                return None
+
+        if config['remove_popups']:
+            start = time.monotonic()
+            await page.evaluate(REMOVE_POPUPS_JS)
+            job.trace.mark('remove_popups', start)
+
+        if config['full_load']:
+            start = time.monotonic()
+            self.update_job(job, '加载内容')
+            await page.evaluate(LAZY_LOAD_JS)
+
+            self.update_job(job, '滚动加载')
+            scroll_pause = config['scroll_pause']
+            max_scroll_time = config['max_scroll_time']
+            start_scroll_time = time.time()
+
+            last_height = 0
+            no_change_count = 0
+            settled = False
+
+            while True:
+                if self.stop_event.is_set():
+                    self.update_job(job, '已停止', state='stopped')
+                    return None
+
+                current_height = await page.evaluate("document.body.scrollHeight")
+
+                if current_height == last_height:
+                    no_change_count += 1
+                    if settled or no_change_count >= 3:
+                        break
+                else:
+                    no_change_count = 0
+
+                last_height = current_height
+
+                await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+                settled = await wait_for_settle(page, tracker, scroll_pause, quiet, self.stop_event)
+
+                elapsed = time.time() - start_scroll_time
+                if elapsed > max_scroll_time:
+                    break
+
+            await page.evaluate("window.scrollTo(0, 0)")
+            await wait_for_settle(page, tracker, 1, quiet, self.stop_event)
+            job.trace.mark('scroll', start)
+
+        self.update_job(job, '生成PDF')
+        start = time.monotonic()
+
+        try:
+            title = None if job.entry else clean_title(await page.title())
+        except Exception:
+            title = None
+
+        if config['stream_pdf']:
+            await stream_pdf(page, job.filepath + '.part', print_options(config))
+        else:
+            await page.pdf(
+                path=job.filepath + '.part',
+                format=config['page_size'],
+                landscape=config['landscape'],
+                print_background=config['print_background'],
+                scale=config['scale'],
+                margin={'top': '1cm', 'bottom': '1cm', 'left': '1cm', 'right': '1cm'},
+                prefer_css_page_size=True
+            )
+        job.trace.mark('pdf', start)
+        return title
+
+
+class BackgroundLoop:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.run, name='engine-loop', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, fn, *args):
+        self.loop.call_soon_threadsafe(fn, *args)
+
+    def stop(self, timeout=5):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import asyncio
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+
+THROTTLE_STATUSES = (429, 503)
+DEFAULT_RETRY_AFTER = 10
+
+
+class HostThrottled(Exception):
+    def __init__(self, url, delay):
+        super().__init__(f'服务器限流，{delay:.0f} 秒后重试: {url}')
+        self.url = url
+        self.delay = delay
+
+
+def host_key(url):
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    return f"{host}:{parts.port}" if parts.port else host
+
+
+def parse_retry_after(value, default=DEFAULT_RETRY_AFTER):
+    if not value:
+        return default
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):
+        if self.rate <= 0:
+            return 0
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def full(self, now):
+        self.refill(now)
+        return self.rate <= 0 or self.tokens >= self.burst
+
+
+class HostState:
+    def __init__(self, rate, burst):
+        self.active = 0
+        self.waiters = deque()
+        self.bucket = TokenBucket(rate, burst)
+        self.blocked_until = 0
+
+
+class HostScheduler:
+    def __init__(self, max_per_host=4, rate=0, burst=1, max_retry_after=300):
+        self.hosts = {}
+        self.released = None
+        self.configure(max_per_host, rate, burst, max_retry_after)
+
+    def configure(self, max_per_host=4, rate=0, burst=1, max_retry_after=300):
+        self.max_per_host = max(1, int(max_per_host))
+        self.rate = max(0.0, float(rate))
+        self.burst = max(1.0, float(burst))
+        self.max_retry_after = max_retry_after
+        for state in self.hosts.values():
+            state.bucket.rate = self.rate
+            state.bucket.burst = self.burst
+
+    def state(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(self.rate, self.burst)
+        return state
+
+    def watch(self):
+        self.released = asyncio.Event()
+        return self.released
+
+    def blocked_for(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            return 0
+        return max(0, state.blocked_until - time.monotonic())
+
+    def try_acquire(self, host):
+        state = self.state(host)
+        if state.active >= self.max_per_host or state.waiters or state.blocked_until > time.monotonic():
+            return False
+        state.active += 1
+        return True
+
+    async def acquire(self, host):
+        state = self.state(host)
+        if state.active < self.max_per_host and not state.waiters:
+            state.active += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        state.waiters.append(waiter)
+        try:
+            await waiter
+        except BaseException:
+            if waiter in state.waiters:
+                state.waiters.remove(waiter)
+            elif not waiter.cancelled():
+                self.release(host)
+            raise
+
+    def release(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            return
+
+        while state.waiters:
+            waiter = state.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+        state.active -= 1
+        if self.released is not None:
+            self.released.set()
+        now = time.monotonic()
+        if state.active <= 0 and state.blocked_until <= now and state.bucket.full(now):
+            del self.hosts[host]
+
+    def defer(self, host, retry_after=None):
+        delay = min(parse_retry_after(retry_after), self.max_retry_after)
+        state = self.state(host)
+        state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+        return delay
+
+    async def wait_turn(self, host, stop_event=None):
+        state = self.state(host)
+        while not (stop_event and stop_event.is_set()):
+            now = time.monotonic()
+            delay = state.blocked_until - now
+            if delay <= 0:
+                delay = state.bucket.take(now)
+                if delay <= 0:
+                    return
+            await asyncio.sleep(min(delay, 1))
+
+
+class HostQueue:
+    def __init__(self):
+        self.queues = {}
+        self.order = deque()
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, host, item):
+        queue = self.queues.get(host)
+        if queue is None:
+            queue = self.queues[host] = deque()
+            self.order.append(host)
+        queue.append(item)
+        self.size += 1
+
+    def pop_ready(self, ready):
+        for _ in range(len(self.order)):
+            host = self.order.popleft()
+            if not ready(host):
+                self.order.append(host)
+                continue
+
+            queue = self.queues[host]
+            item = queue.popleft()
+            self.size -= 1
+            if queue:
+                self.order.append(host)
+            else:
+                del self.queues[host]
+            return item
+        return None
+
+    def clear(self):
+        dropped = self.size
+        self.queues.clear()
+        self.order.clear()
+        self.size = 0
+        return dropped
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import re
+import logging
+import mimetypes
+import importlib.util
+from contextlib import redirect_stdout
+from urllib.parse import urlparse
+
+if __package__:
+    from .resource_policy import ResourcePolicy, BlockStats
+    from .print_stream import PAPER_SIZES
+    from .process_pool import ProcessPool
+else:
+    from resource_policy import ResourcePolicy, BlockStats
+    from print_stream import PAPER_SIZES
+    from process_pool import ProcessPool
+
+
+HTML_ENGINES = ('auto', 'chromium')
+MAX_HTML_SIZE = 5 * 1024 * 1024
+MIN_TEXT = 200
+FETCH_TIMEOUT = 15
+
+FRAMEWORK_ATTRS = ('data-reactroot', 'ng-app', 'ng-version', 'data-v-app', 'data-server-rendered', 'x-data')
+MOUNT_IDS = ('root', 'app', '__next', '__nuxt', '___gatsby', 'svelte')
+STATE_SCRIPT_IDS = ('__NEXT_DATA__', '__NUXT_DATA__')
+STATE_MARKERS = ('window.__NUXT__', '__INITIAL_STATE__', '__PRELOADED_STATE__', '__APOLLO_STATE__', '__remixContext')
+FRAMEWORK_SRC = re.compile(r'(?:^|[/._-])(?:react(?:-dom)?|vue|angular|svelte|ember|preact|_next|_nuxt|gatsby)(?:[/._-]|$)', re.I)
+DYNAMIC_SCRIPT = re.compile(
+    r"IntersectionObserver|addEventListener\(\s*['\"]scroll|\bonscroll\b|insertAdjacentHTML|\.innerHTML\s*=|"
+    r"document\.write\(|\bfetch\(|XMLHttpRequest"
+)
+NOSCRIPT_HINTS = (
+    'enablejavascript', 'turnonjavascript', 'javascriptisrequired', 'requiresjavascript', 'javascriptisdisabled',
+    'javascriptmustbeenabled', '启用javascript', '开启javascript', '打开javascript', '需要javascript', '支持javascript',
+    'javascript已禁用', '允许javascript'
+)
+LAZY_ATTRS = ('data-src', 'data-lazy-src', 'data-original', 'data-srcset')
+
+
+def weasyprint_available():
+    return importlib.util.find_spec('weasyprint') is not None
+
+
+def parse_html(body, encoding=None):
+    from bs4 import BeautifulSoup
+
+    parser = 'lxml' if importlib.util.find_spec('lxml') is not None else 'html.parser'
+    return BeautifulSoup(body, parser, from_encoding=encoding)
+
+
+def visible_text(soup):
+    body = soup.body
+    if body is None:
+        return ''
+    text = []
+    for node in body.find_all(string=True):
+        if node.find_parent(('script', 'style', 'noscript', 'template', 'svg')) is None:
+            text.append(node.strip())
+    return ''.join(text)
+
+
+def needs_javascript(soup):
+    for attr in FRAMEWORK_ATTRS:
+        if soup.find(attrs={attr: True}) is not None:
+            return 'framework'
+    for mount in MOUNT_IDS:
+        node = soup.find(id=mount)
+        if node is not None and node.find(True) is None:
+            return 'framework'
+
+    for script in soup.find_all('script'):
+        src = script.get('src')
+        if src:
+            if FRAMEWORK_SRC.search(urlparse(src).path):
+                return 'framework'
+            continue
+        if script.get('id') in STATE_SCRIPT_IDS:
+            return 'framework'
+        code = script.string or ''
+        if any(marker in code for marker in STATE_MARKERS):
+            return 'framework'
+        if DYNAMIC_SCRIPT.search(code):
+            return 'dynamic_script'
+
+    for noscript in soup.find_all('noscript'):
+        hint = re.sub(r'\s+', '', noscript.get_text()).lower()
+        if any(h in hint for h in NOSCRIPT_HINTS):
+            return 'noscript'
+
+    for img in soup.find_all('img'):
+        src = img.get('src', '')
+        if (not src or src.startswith('data:')) and any(img.get(attr) for attr in LAZY_ATTRS):
+            return 'lazy_images'
+    if soup.find(('canvas', 'iframe', 'frameset')) is not None:
+        return 'embedded'
+
+    if len(visible_text(soup)) < MIN_TEXT:
+        return 'empty_body'
+    return None
+
+
+def page_css(options):
+    width, height = PAPER_SIZES.get(str(options['page_size']).lower(), PAPER_SIZES['a4'])
+    if options['landscape']:
+        width, height = height, width
+    css = f'@page {{ size: {width}in {height}in; margin: 1cm; }}'
+    if not options['print_background']:
+        css += ' *, *::before, *::after { background: none !important; }'
+    return css
+
+
+class FetchRequest:
+    def __init__(self, url):
+        self.url = url
+        self.headers = {}
+        mime = mimetypes.guess_type(urlparse(url).path)[0] or ''
+        self.resource_type = 'font' if mime.startswith(('font/', 'application/font')) else (
+            'image' if mime.startswith('image/') else 'other')
+
+    def is_navigation_request(self):
+        return False
+
+
+def render_static(body, base_url, path, options, encoding=None, want_title=True):
+    soup = parse_html(body, encoding)
+    reason = needs_javascript(soup)
+    if reason:
+        return {'reason': reason}
+
+    try:
+        with redirect_stdout(io.StringIO()):
+            from weasyprint import HTML, CSS, default_url_fetcher
+    except (ImportError, OSError):
+        return {'unavailable': True}
+    logging.getLogger('weasyprint').setLevel(logging.ERROR)
+    logging.getLogger('fontTools').setLevel(logging.ERROR)
+
+    policy = ResourcePolicy(options)
+    stats = BlockStats()
+
+    def fetch(url):
+        if not url.startswith('data:'):
+            reason, category = policy.decide(FetchRequest(url), base_url)
+            if reason:
+                stats.add(reason, category)
+                raise ValueError(f'blocked: {url}')
+        return default_url_fetcher(url, timeout=FETCH_TIMEOUT)
+
+    title = soup.title.get_text() if want_title and soup.title else None
+    document = HTML(file_obj=io.BytesIO(body), base_url=base_url, encoding=encoding, url_fetcher=fetch)
+    document.write_pdf(path, stylesheets=[CSS(string=page_css(options))], zoom=float(options['scale']))
+    return {'title': title, 'blocked': stats}
+
+
+class HtmlRenderer(ProcessPool):
+    async def render(self, body, base_url, path, options, encoding=None, want_title=True):
+        return await self.run(render_static, body, base_url, path, options, encoding, want_title)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import math
+import hashlib
+from itertools import chain, islice
+
+if __package__:
+    from .urlnorm import normalize_url
+else:
+    from urlnorm import normalize_url
+
+
+def url_digest(url):
+    return hashlib.blake2b(url.encode('utf-8'), digest_size=16).digest()
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        self.bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+
+    def positions(self, digest):
+        a = int.from_bytes(digest[:8], 'little')
+        b = int.from_bytes(digest[8:], 'little') | 1
+        return [(a + i * b) % self.bits for i in range(self.hashes)]
+
+    def add(self, digest):
+        for pos in self.positions(digest):
+            self.array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, digest):
+        return all(self.array[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(digest))
+
+
+class UrlDedupe:
+    def __init__(self, exact_limit=1000000, capacity=10000000, error_rate=0.001):
+        self.exact_limit = exact_limit
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.seen = set()
+        self.bloom = None
+
+    def add(self, url):
+        digest = url_digest(url)
+
+        if self.bloom is not None:
+            if digest in self.bloom:
+                return False
+            self.bloom.add(digest)
+            return True
+
+        if digest in self.seen:
+            return False
+        self.seen.add(digest)
+
+        if len(self.seen) >= self.exact_limit:
+            self.bloom = BloomFilter(max(self.capacity, self.exact_limit * 2), self.error_rate)
+            for seen in self.seen:
+                self.bloom.add(seen)
+            self.seen = set()
+        return True
+
+
+class IngestStats:
+    def __init__(self, lines=0, accepted=0, duplicates=0, invalid=0):
+        self.lines = lines
+        self.accepted = accepted
+        self.duplicates = duplicates
+        self.invalid = invalid
+
+    def to_dict(self):
+        return {
+            'lines': self.lines,
+            'accepted': self.accepted,
+            'duplicates': self.duplicates,
+            'invalid': self.invalid
+        }
+
+
+def iter_url_lines(source):
+    if source == '-':
+        lines = sys.stdin
+    else:
+        lines = open(source, 'r', encoding='utf-8-sig', errors='replace')
+
+    try:
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
+
+def iter_sources(sources, skip=0):
+    lines = chain.from_iterable(
+        iter(source) if isinstance(source, list) else iter_url_lines(source) for source in sources
+    )
+    return islice(lines, skip, None)
+
+
+def iter_unique_urls(lines, strip_params=(), dedupe=None, stats=None):
+    dedupe = dedupe or UrlDedupe()
+    stats = stats or IngestStats()
+
+    for line in lines:
+        stats.lines += 1
+        try:
+            url = normalize_url(line, strip_params)
+        except ValueError:
+            stats.invalid += 1
+            continue
+
+        if not dedupe.add(url):
+            stats.duplicates += 1
+            continue
+
+        stats.accepted += 1
+        yield url
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import json
+import uuid
+import socket
+import sqlite3
+from contextlib import contextmanager
+
+
+FLUSH_INTERVAL = 0.5
+FLUSH_BATCH = 256
+
+def process_alive(pid):
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        return psutil.pid_exists(pid)
+    if os.name == 'nt':
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def make_owner():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+class JobStore:
+    def __init__(self, path, owner=None):
+        self.path = path
+        self.owner = owner or make_owner()
+        self.unflushed = []
+        self.flushed = time.monotonic()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('PRAGMA busy_timeout=5000')
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS batches (
+                id INTEGER PRIMARY KEY,
+                state TEXT NOT NULL DEFAULT 'open',
+                sources TEXT,
+                stats TEXT,
+                ingested INTEGER NOT NULL DEFAULT 0,
+                created_at REAL,
+                updated_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                batch_id INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_until REAL,
+                result TEXT,
+                error TEXT,
+                updated_at REAL,
+                UNIQUE (batch_id, url)
+            );
+            CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (batch_id, state, id);
+        ''')
+
+    def create_batch(self, sources=None):
+        now = time.time()
+        cursor = self.db.execute(
+            'INSERT INTO batches (sources, stats, created_at, updated_at) VALUES (?, ?, ?, ?)',
+            (json.dumps(sources, ensure_ascii=False) if sources is not None else None, '{}', now, now)
+        )
+        return self.batch(cursor.lastrowid)
+
+    def batch(self, batch_id):
+        row = self.db.execute('SELECT * FROM batches WHERE id = ?', (batch_id,)).fetchone()
+        if row is None:
+            return None
+        batch = dict(row)
+        batch['sources'] = json.loads(batch['sources']) if batch['sources'] else None
+        batch['stats'] = json.loads(batch['stats'] or '{}')
+        batch['counts'] = self.counts(batch_id)
+        return batch
+
+    def unfinished(self):
+        row = self.db.execute("SELECT id FROM batches WHERE state = 'open' ORDER BY id DESC LIMIT 1").fetchone()
+        return self.batch(row['id']) if row else None
+
+    def close_batch(self, batch_id, state='done'):
+        self.db.execute('UPDATE batches SET state = ?, updated_at = ? WHERE id = ?', (state, time.time(), batch_id))
+
+    def counts(self, batch_id):
+        counts = {'pending': 0, 'running': 0, 'done': 0, 'failed': 0}
+        for state, count in self.db.execute(
+                'SELECT state, COUNT(*) FROM jobs WHERE batch_id = ? GROUP BY state', (batch_id,)):
+            counts[state] = count
+        return counts
+
+    def add(self, batch_id, urls, stats, ingested=False):
+        now = time.time()
+        with self.transaction():
+            cursor = self.db.executemany(
+                'INSERT OR IGNORE INTO jobs (batch_id, url, updated_at) VALUES (?, ?, ?)',
+                [(batch_id, url, now) for url in urls]
+            )
+            skipped = len(urls) - max(0, cursor.rowcount)
+            stats.accepted -= skipped
+            stats.duplicates += skipped
+            self.db.execute(
+                'UPDATE batches SET stats = ?, ingested = ?, updated_at = ? WHERE id = ?',
+                (json.dumps(stats.to_dict()), int(ingested), now, batch_id)
+            )
+
+    def recover(self, batch_id):
+        host = socket.gethostname()
+        owners = [row[0] for row in self.db.execute(
+            "SELECT DISTINCT lease_owner FROM jobs WHERE batch_id = ? AND state = 'running'", (batch_id,))]
+        for owner in owners:
+            parts = (owner or '').split(':')
+            if owner == self.owner or len(parts) != 3 or parts[0] != host or not parts[1].isdigit():
+                continue
+            if not process_alive(int(parts[1])):
+                self.db.execute(
+                    "UPDATE jobs SET state = 'pending', lease_owner = NULL, lease_until = NULL "
+                    "WHERE batch_id = ? AND state = 'running' AND lease_owner = ?", (batch_id, owner)
+                )
+
+    def claim(self, batch_id, limit, lease, owner=None):
+        owner = owner or self.owner
+        now = time.time()
+        with self.transaction():
+            rows = self.db.execute(
+                "SELECT id, url FROM jobs WHERE batch_id = ? AND (state = 'pending' OR "
+                "(state = 'running' AND lease_until < ?)) ORDER BY id LIMIT ?",
+                (batch_id, now, limit)
+            ).fetchall()
+            self.db.executemany(
+                "UPDATE jobs SET state = 'running', attempts = attempts + 1, lease_owner = ?, lease_until = ?, "
+                "updated_at = ? WHERE id = ?",
+                [(owner, now + lease, now, row['id']) for row in rows]
+            )
+        return [(row['id'], row['url']) for row in rows]
+
+    def leased_elsewhere(self, batch_id):
+        row = self.db.execute(
+            "SELECT MIN(lease_until) FROM jobs WHERE batch_id = ? AND state = 'running' AND lease_owner != ?",
+            (batch_id, self.owner)
+        ).fetchone()
+        return row[0]
+
+    def renew(self, lease, owner=None, job_ids=None):
+        now = time.time()
+        owner = owner or self.owner
+        if job_ids is None:
+            self.db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE state = 'running' AND lease_owner = ?", (now + lease, owner)
+            )
+            return
+        self.db.executemany(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND state = 'running' AND lease_owner = ?",
+            [(now + lease, int(job_id), owner) for job_id in job_ids]
+        )
+
+    def transfer(self, job_id, owner, new_owner, lease):
+        cursor = self.db.execute(
+            "UPDATE jobs SET lease_owner = ?, lease_until = ? WHERE id = ? AND state = 'running' AND lease_owner = ?",
+            (new_owner, time.time() + lease, job_id, owner)
+        )
+        return cursor.rowcount > 0
+
+    def finish(self, job_id, state, attempts=0, result=None, error=None, owner=None):
+        self.unflushed.append((job_id, state, attempts, result, error, owner or self.owner))
+
+    def flush(self, force=True):
+        if not self.unflushed:
+            return
+        if not force and len(self.unflushed) < FLUSH_BATCH and time.monotonic() - self.flushed < FLUSH_INTERVAL:
+            return
+
+        now = time.time()
+        updates, self.unflushed = self.unflushed, []
+        self.flushed = time.monotonic()
+        finished = [
+            (state, attempts, json.dumps(result, ensure_ascii=False) if result else None, error, now, job_id, owner)
+            for job_id, state, attempts, result, error, owner in updates if state in ('done', 'failed')
+        ]
+        released = [(now, job_id, owner) for job_id, state, _, _, _, owner in updates if state not in ('done', 'failed')]
+        with self.transaction():
+            self.db.executemany(
+                'UPDATE jobs SET state = ?, attempts = attempts + ?, result = ?, error = ?, '
+                'lease_owner = NULL, lease_until = NULL, updated_at = ? WHERE id = ? AND lease_owner = ?',
+                finished
+            )
+            self.db.executemany(
+                "UPDATE jobs SET state = 'pending', attempts = MAX(0, attempts - 1), lease_owner = NULL, "
+                "lease_until = NULL, updated_at = ? WHERE id = ? AND lease_owner = ?",
+                released
+            )
+
+    def release(self, batch_id):
+        self.flush()
+        self.db.execute(
+            "UPDATE jobs SET state = 'pending', attempts = MAX(0, attempts - 1), lease_owner = NULL, "
+            "lease_until = NULL WHERE batch_id = ? AND state = 'running' AND lease_owner = ?",
+            (batch_id, self.owner)
+        )
+
+    @contextmanager
+    def transaction(self):
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        self.db.execute('COMMIT')
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
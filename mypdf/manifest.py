@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import json
+import sqlite3
+import hashlib
+
+if __package__:
+    from .urlnorm import normalize_url
+else:
+    from urlnorm import normalize_url
+
+
+FIELDS = ('url', 'kind', 'etag', 'last_modified', 'content_hash', 'source_hash', 'path', 'settings_hash', 'size')
+
+
+def settings_hash(config, keys):
+    data = json.dumps({key: config.get(key) for key in keys}, sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS downloads (
+                url_key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                kind TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                source_hash TEXT,
+                path TEXT,
+                settings_hash TEXT,
+                size INTEGER,
+                updated_at REAL
+            )
+        ''')
+        self.db.commit()
+
+    def get(self, url):
+        row = self.db.execute('SELECT * FROM downloads WHERE url_key = ?', (normalize_url(url),)).fetchone()
+        return dict(row) if row else None
+
+    def record(self, url, **fields):
+        fields = {key: value for key, value in fields.items() if key in FIELDS}
+        fields['url'] = url
+        fields['updated_at'] = time.time()
+
+        columns = ', '.join(['url_key'] + list(fields))
+        placeholders = ', '.join('?' * (len(fields) + 1))
+        updates = ', '.join(f'{key} = excluded.{key}' for key in fields)
+        self.db.execute(
+            f'INSERT INTO downloads ({columns}) VALUES ({placeholders}) '
+            f'ON CONFLICT(url_key) DO UPDATE SET {updates}',
+            [normalize_url(url)] + list(fields.values())
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
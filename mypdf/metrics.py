@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+from datetime import datetime
+from contextlib import contextmanager
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+METRIC_HELP = {
+    'mypdf_jobs_total': ('counter', '已结束的任务数'),
+    'mypdf_retries_total': ('counter', '重试次数'),
+    'mypdf_requests_total': ('counter', '发出的 HTTP 请求数'),
+    'mypdf_bytes_total': ('counter', '下载的字节数'),
+    'mypdf_renders_total': ('counter', '按渲染方式（weasyprint/chromium）统计的网页任务数'),
+    'mypdf_queue_depth': ('gauge', '已读取但尚未派发的地址数'),
+    'mypdf_jobs_in_flight': ('gauge', '已派发但尚未结束的任务数'),
+    'mypdf_lane_active': ('gauge', '正在占用下载/渲染通道的任务数'),
+    'mypdf_stage_seconds': ('histogram', '各阶段耗时'),
+    'mypdf_job_seconds': ('histogram', '单个任务总耗时')
+}
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+class JobTrace:
+    def __init__(self):
+        self.started_at = time.time()
+        self.started = time.monotonic()
+        self.spans = []
+        self.bytes = 0
+        self.requests = 0
+
+    def mark(self, stage, start):
+        now = time.monotonic()
+        self.spans.append((stage, start - self.started, now - start))
+
+    @contextmanager
+    def span(self, stage):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.mark(stage, start)
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def stages(self):
+        totals = {}
+        for stage, _, duration in self.spans:
+            totals[stage] = totals.get(stage, 0) + duration
+        return totals
+
+    def to_dict(self):
+        return {
+            'started': datetime.fromtimestamp(self.started_at).isoformat(timespec='milliseconds'),
+            'duration': round(self.elapsed(), 4),
+            'stages': {stage: round(duration, 4) for stage, duration in self.stages().items()},
+            'spans': [[stage, round(offset, 4), round(duration, 4)] for stage, offset, duration in self.spans],
+            'bytes': self.bytes,
+            'requests': self.requests
+        }
+
+
+class Metrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def add(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.gauges[key] = self.gauges.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = [[0] * len(self.buckets), 0, 0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                histogram[0][i] += 1
+        histogram[1] += 1
+        histogram[2] += value
+
+    def record_job(self, job):
+        kind = 'pdf' if job.is_pdf else ('webpage' if job.is_pdf is False else 'unknown')
+        self.inc('mypdf_jobs_total', kind=kind, state=job.state)
+        self.inc('mypdf_requests_total', job.trace.requests, kind=kind)
+        self.inc('mypdf_bytes_total', job.trace.bytes, kind=kind)
+        if job.renderer:
+            self.inc('mypdf_renders_total', renderer=job.renderer, state=job.state)
+        if job.attempts:
+            self.inc('mypdf_retries_total', job.attempts, kind=kind)
+        self.observe('mypdf_job_seconds', job.trace.elapsed(), kind=kind, state=job.state)
+        for stage, duration in job.trace.stages().items():
+            self.observe('mypdf_stage_seconds', duration, stage=stage)
+
+    def render(self):
+        families = {}
+        for (name, labels), value in self.counters.items():
+            families.setdefault(name, []).append(f'{name}{format_labels(labels)} {value}')
+        for (name, labels), value in self.gauges.items():
+            families.setdefault(name, []).append(f'{name}{format_labels(labels)} {value}')
+        for (name, labels), (counts, count, total) in self.histograms.items():
+            lines = families.setdefault(name, [])
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", bound),))} {bucket_count}')
+            lines.append(f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+
+        output = []
+        for name in sorted(families):
+            kind, text = METRIC_HELP.get(name, ('untyped', name))
+            output.append(f'# HELP {name} {text}')
+            output.append(f'# TYPE {name} {kind}')
+            output.extend(families[name])
+        return '\n'.join(output) + '\n'
+
+
+class MetricsServer:
+    def __init__(self, metrics, host='127.0.0.1', port=9464):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.runner = None
+
+    async def start(self):
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(body=self.metrics.render().encode('utf-8'),
+                                headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+
+
+class PartFile:
+    def __init__(self, filepath, url, save_interval=1.0):
+        self.filepath = filepath
+        self.url = url
+        self.path = filepath + '.part'
+        self.meta_path = filepath + '.part.json'
+        self.save_interval = save_interval
+        self.meta = {}
+        self.last_save = 0
+
+    @staticmethod
+    def owner(filepath):
+        try:
+            with open(filepath + '.part.json', 'r', encoding='utf-8') as f:
+                return json.load(f).get('url')
+        except (OSError, ValueError):
+            return None
+
+    def load(self):
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if meta.get('url') != self.url or not os.path.exists(self.path) or not meta.get('segments'):
+            return False
+
+        self.meta = meta
+        return True
+
+    def reset(self, headers, total_size, ranges):
+        resumable = not headers.get('Content-Encoding')
+        self.meta = {
+            'url': self.url,
+            'etag': headers.get('ETag', '') if resumable else '',
+            'last_modified': headers.get('Last-Modified', '') if resumable else '',
+            'total_size': total_size,
+            'segments': [[start, end, start] for start, end in ranges]
+        }
+
+    @property
+    def segments(self):
+        return self.meta['segments']
+
+    @property
+    def total_size(self):
+        return self.meta.get('total_size') or 0
+
+    def validator(self):
+        etag = self.meta.get('etag', '')
+        if etag and not etag.startswith('W/'):
+            return etag
+        return self.meta.get('last_modified', '')
+
+    def downloaded(self):
+        return sum(offset - start for start, end, offset in self.segments)
+
+    def pending(self):
+        return [seg for seg in self.segments if seg[1] is None or seg[2] <= seg[1]]
+
+    def open(self, fresh):
+        if fresh or not os.path.exists(self.path):
+            f = open(self.path, 'wb')
+            if len(self.segments) > 1:
+                f.truncate(self.total_size)
+        else:
+            f = open(self.path, 'r+b')
+        return f
+
+    def save(self, force=False):
+        now = time.monotonic()
+        if not self.meta or (not force and now - self.last_save < self.save_interval):
+            return
+
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self.meta_path)
+        self.last_save = now
+
+    def commit(self):
+        os.replace(self.path, self.filepath)
+        self.remove_meta()
+
+    def discard(self):
+        for path in (self.path, self.meta_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def remove_meta(self):
+        try:
+            os.remove(self.meta_path)
+        except OSError:
+            pass
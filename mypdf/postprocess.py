@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import hashlib
+import importlib.util
+from contextlib import ExitStack
+
+if __package__:
+    from .process_pool import ProcessPool
+else:
+    from process_pool import ProcessPool
+
+
+OPTIMIZE_MODES = ('none', 'webpage', 'all')
+
+
+def pikepdf_available():
+    return importlib.util.find_spec('pikepdf') is not None
+
+
+def object_key(obj, memo):
+    import pikepdf
+
+    indirect = obj.is_indirect if isinstance(obj, pikepdf.Object) else False
+    if indirect:
+        og = obj.objgen
+        if og in memo:
+            return memo[og] or b'cycle'
+        memo[og] = None
+
+    digest = hashlib.sha256()
+    if isinstance(obj, pikepdf.Stream):
+        digest.update(b'stream')
+        digest.update(obj.read_raw_bytes())
+    if isinstance(obj, (pikepdf.Dictionary, pikepdf.Stream)):
+        for name in sorted(obj.keys()):
+            if name in ('/Length', '/Parent'):
+                continue
+            digest.update(name.encode('latin-1'))
+            digest.update(object_key(obj[name], memo))
+    elif isinstance(obj, pikepdf.Array):
+        digest.update(b'[')
+        for item in obj:
+            digest.update(object_key(item, memo))
+    else:
+        digest.update(repr(obj).encode('utf-8', 'replace'))
+
+    key = digest.digest()
+    if indirect:
+        memo[obj.objgen] = key
+    return key
+
+
+def dedupe_resources(pdf):
+    import pikepdf
+
+    memo = {}
+    canonical = {}
+    seen = set()
+    counts = {'images': 0, 'fonts': 0}
+
+    def visit(resources):
+        if not isinstance(resources, pikepdf.Dictionary):
+            return
+        if resources.is_indirect:
+            if resources.objgen in seen:
+                return
+            seen.add(resources.objgen)
+
+        for category, kind in (('/XObject', 'images'), ('/Font', 'fonts')):
+            entries = resources.get(category)
+            if not isinstance(entries, pikepdf.Dictionary):
+                continue
+            for name in list(entries.keys()):
+                obj = entries[name]
+                if not obj.is_indirect:
+                    continue
+                if category == '/XObject' and obj.get('/Subtype') == '/Form':
+                    visit(obj.get('/Resources'))
+                    continue
+                if category == '/XObject' and obj.get('/Subtype') != '/Image':
+                    continue
+
+                key = object_key(obj, memo)
+                first = canonical.setdefault(key, obj)
+                if first.objgen != obj.objgen:
+                    entries[name] = first
+                    counts[kind] += 1
+
+    for page in pdf.pages:
+        visit(page.obj.get('/Resources'))
+    return counts
+
+
+def save_pdf(pdf, path, linearize):
+    import pikepdf
+
+    tmp_path = path + '.opt.tmp'
+    try:
+        pdf.save(tmp_path, compress_streams=True, object_stream_mode=pikepdf.ObjectStreamMode.generate,
+                 linearize=linearize)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+def optimize_pdf(path, linearize=True):
+    import pikepdf
+
+    before = os.path.getsize(path)
+    with pikepdf.open(path) as pdf:
+        counts = dedupe_resources(pdf)
+        pdf.remove_unreferenced_resources()
+        tmp_path = save_pdf(pdf, path, linearize)
+
+    after = os.path.getsize(tmp_path)
+    if after < before or linearize:
+        os.replace(tmp_path, path)
+    else:
+        os.remove(tmp_path)
+        after = before
+
+    counts.update(before=before, after=after)
+    return counts
+
+
+def merge_pdfs(paths, output, linearize=True):
+    import pikepdf
+
+    bundle = pikepdf.new()
+    with ExitStack() as stack:
+        with bundle.open_outline() as outline:
+            for path in paths:
+                source = stack.enter_context(pikepdf.open(path))
+                outline.root.append(pikepdf.OutlineItem(os.path.splitext(os.path.basename(path))[0],
+                                                        len(bundle.pages)))
+                bundle.pages.extend(source.pages)
+
+        counts = dedupe_resources(bundle)
+        tmp_path = save_pdf(bundle, output, linearize)
+    os.replace(tmp_path, output)
+
+    counts.update(files=len(paths), pages=len(bundle.pages), after=os.path.getsize(output))
+    return counts
+
+
+class PostProcessor(ProcessPool):
+    async def optimize(self, path, linearize=True):
+        return await self.run(optimize_pdf, path, linearize)
+
+    async def merge(self, paths, output, linearize=True):
+        return await self.run(merge_pdfs, paths, output, linearize)
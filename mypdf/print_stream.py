@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import base64
+
+
+READ_CHUNK = 1024 * 1024
+CM = 1 / 2.54
+
+PAPER_SIZES = {
+    'letter': (8.5, 11),
+    'legal': (8.5, 14),
+    'tabloid': (11, 17),
+    'ledger': (17, 11),
+    'a0': (33.1, 46.8),
+    'a1': (23.4, 33.1),
+    'a2': (16.54, 23.4),
+    'a3': (11.7, 16.54),
+    'a4': (8.27, 11.7),
+    'a5': (5.83, 8.27),
+    'a6': (4.13, 5.83)
+}
+
+
+def print_options(config, margin_cm=1):
+    width, height = PAPER_SIZES.get(str(config['page_size']).lower(), PAPER_SIZES['a4'])
+    margin = margin_cm * CM
+    return {
+        'landscape': bool(config['landscape']),
+        'printBackground': bool(config['print_background']),
+        'scale': float(config['scale']),
+        'paperWidth': width,
+        'paperHeight': height,
+        'marginTop': margin,
+        'marginBottom': margin,
+        'marginLeft': margin,
+        'marginRight': margin,
+        'preferCSSPageSize': True
+    }
+
+
+async def stream_pdf(page, path, options, chunk_size=READ_CHUNK):
+    cdp = await page.context.new_cdp_session(page)
+    try:
+        result = await cdp.send('Page.printToPDF', dict(options, transferMode='ReturnAsStream'))
+        handle = result['stream']
+        size = 0
+        try:
+            with open(path, 'wb') as f:
+                while True:
+                    chunk = await cdp.send('IO.read', {'handle': handle, 'size': chunk_size})
+                    data = chunk.get('data', '')
+                    data = base64.b64decode(data) if chunk.get('base64Encoded') else data.encode('utf-8')
+                    f.write(data)
+                    size += len(data)
+                    if chunk.get('eof'):
+                        break
+        finally:
+            await cdp.send('IO.close', {'handle': handle})
+        return size
+    finally:
+        try:
+            await cdp.detach()
+        except Exception:
+            pass
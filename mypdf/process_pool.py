@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class ProcessPool:
+    def __init__(self, workers=0):
+        self.workers = workers
+        self.executor = None
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers or None,
+                                                mp_context=multiprocessing.get_context('spawn'))
+        return self.executor
+
+    async def run(self, fn, *args):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.get_executor(), fn, *args)
+        except BrokenProcessPool:
+            self.close()
+            raise
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
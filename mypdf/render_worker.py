@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import asyncio
+import threading
+import importlib.util
+import multiprocessing
+from contextlib import asynccontextmanager
+
+if __package__:
+    from .retry import classify_error
+else:
+    from retry import classify_error
+
+
+CHECK_INTERVAL = 1.0
+CLOSE_TIMEOUT = 10
+
+WORKER_OVERRIDES = {
+    'render_workers': 0,
+    'browser_pool_size': 1,
+    'per_host_rate': 0,
+    'manifest': False,
+    'job_store': False,
+    'metrics_port': 0,
+    'trace_file': ''
+}
+
+
+def psutil_available():
+    return importlib.util.find_spec('psutil') is not None
+
+
+def process_rss(pid):
+    try:
+        import psutil
+    except ImportError:
+        return 0
+
+    try:
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.Error:
+        return 0
+
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+
+def worker_main(conn):
+    if __package__:
+        from .engine import DownloadEngine, DownloadJob
+    else:
+        from engine import DownloadEngine, DownloadJob
+
+    asyncio.run(serve(conn, DownloadEngine, DownloadJob))
+
+
+async def serve(conn, engine_class, job_class):
+    loop = asyncio.get_running_loop()
+    requests = asyncio.Queue()
+    engine = engine_class(WORKER_OVERRIDES, on_update=lambda job: conn.send(('status', job.status)))
+    engine.warm_up_task = asyncio.ensure_future(engine.warm_up_browsers())
+
+    def read():
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                message = None
+            if message is not None and message[0] == 'stop':
+                engine.stop()
+                continue
+            if message is not None:
+                engine.stop_event.clear()
+            loop.call_soon_threadsafe(requests.put_nowait, message)
+            if message is None:
+                break
+
+    threading.Thread(target=read, name='render-worker-ipc', daemon=True).start()
+    pages = 0
+    try:
+        while True:
+            message = await requests.get()
+            if message is None:
+                break
+            _, url, path, entry, config, max_rss = message
+
+            engine.configure(dict(config, **WORKER_OVERRIDES))
+            job = job_class(url)
+            job.filepath = path
+            job.entry = entry
+            job.is_pdf = False
+            result = {}
+            try:
+                await engine.start()
+                result['title'] = await engine.render_local(job)
+            except Exception as e:
+                result.update(error=str(e), kind=classify_error(e), delay=getattr(e, 'delay', 0))
+
+            pages += 1
+            result.update(
+                stopped=job.state == 'stopped',
+                source=job.source,
+                blocked=job.block_stats,
+                cache=job.cache_stats,
+                spans=job.trace.spans,
+                requests=job.trace.requests,
+                bytes=job.trace.bytes,
+                recycle=pages >= int(config['max_pages_per_browser'])
+                or bool(max_rss and process_rss(os.getpid()) > max_rss)
+            )
+            conn.send(('result', result))
+            if result['recycle']:
+                break
+    finally:
+        await asyncio.gather(engine.warm_up_task, return_exceptions=True)
+        await engine.close()
+        conn.close()
+
+
+class RenderWorker:
+    def __init__(self, context):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child,), name='mypdf-render', daemon=True)
+        self.process.start()
+        child.close()
+        self.alive = True
+        self.retiring = False
+        self.killed = None
+        self.max_rss = 0
+        self.future = None
+        self.on_status = None
+
+    def listen(self, loop):
+        def read():
+            while True:
+                try:
+                    message = self.conn.recv()
+                except (EOFError, OSError):
+                    loop.call_soon_threadsafe(self.lost)
+                    break
+                loop.call_soon_threadsafe(self.dispatch, message)
+
+        threading.Thread(target=read, name='render-worker-reader', daemon=True).start()
+
+    def dispatch(self, message):
+        kind, payload = message
+        if kind == 'status':
+            if self.on_status is not None:
+                self.on_status(payload)
+        elif self.future is not None and not self.future.done():
+            self.retiring = self.retiring or payload['recycle']
+            self.future.set_result(payload)
+
+    def lost(self):
+        self.alive = False
+        if self.future is not None and not self.future.done():
+            self.future.set_result({
+                'error': self.killed or f'渲染进程意外退出（exitcode {self.process.exitcode}）',
+                'kind': 'fatal' if self.killed else 'retryable',
+                'stopped': False, 'source': {}, 'blocked': None, 'cache': None,
+                'spans': [], 'requests': 0, 'bytes': 0
+            })
+
+    async def render(self, job, config, stop_event, on_status):
+        max_rss = self.max_rss
+        loop = asyncio.get_running_loop()
+        self.future = loop.create_future()
+        self.on_status = on_status
+        stopping = False
+        try:
+            self.conn.send(('render', job.url, job.filepath, job.entry, config, max_rss))
+            while not self.future.done():
+                if stop_event.is_set() and not stopping:
+                    stopping = True
+                    self.conn.send(('stop',))
+                await asyncio.wait([self.future], timeout=CHECK_INTERVAL)
+                if max_rss and not self.future.done():
+                    rss = await loop.run_in_executor(None, process_rss, self.process.pid)
+                    if rss > max_rss and not self.future.done():
+                        self.killed = f'渲染进程内存超过上限（{rss // (1024 * 1024)} MB）'
+                        self.process.kill()
+            return self.future.result()
+        except (OSError, EOFError):
+            self.alive = False
+            raise
+        finally:
+            self.future = None
+            self.on_status = None
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(CLOSE_TIMEOUT)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class RenderPool:
+    def __init__(self, size=1, max_rss_mb=0):
+        self.context = multiprocessing.get_context('spawn')
+        self.size = max(1, int(size))
+        self.max_rss = max(0, int(max_rss_mb)) * 1024 * 1024
+        self.idle = []
+        self.busy = 0
+        self.condition = None
+        self.closing = set()
+
+    def configure(self, size, max_rss_mb=0):
+        self.size = max(1, int(size))
+        self.max_rss = max(0, int(max_rss_mb)) * 1024 * 1024
+
+    def spawn(self):
+        worker = RenderWorker(self.context)
+        worker.listen(asyncio.get_running_loop())
+        return worker
+
+    def retire(self, worker):
+        task = asyncio.get_running_loop().run_in_executor(None, worker.close)
+        self.closing.add(task)
+        task.add_done_callback(self.closing.discard)
+
+    async def warm_up(self):
+        missing = self.size - len(self.idle) - self.busy
+        workers = await asyncio.gather(*[self.acquire() for _ in range(max(0, missing))], return_exceptions=True)
+        for worker in workers:
+            if isinstance(worker, RenderWorker):
+                await self.release(worker)
+
+    async def acquire(self):
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.busy < self.size)
+            self.busy += 1
+
+        while self.idle:
+            worker = self.idle.pop()
+            if worker.alive and not worker.retiring:
+                return worker
+            self.retire(worker)
+        try:
+            return self.spawn()
+        except BaseException:
+            await self.release(None)
+            raise
+
+    async def release(self, worker):
+        if worker is not None:
+            if worker.alive and not worker.retiring and len(self.idle) < self.size:
+                self.idle.append(worker)
+            else:
+                self.retire(worker)
+        async with self.condition:
+            self.busy -= 1
+            self.condition.notify()
+
+    @asynccontextmanager
+    async def worker(self):
+        worker = await self.acquire()
+        worker.max_rss = self.max_rss
+        try:
+            yield worker
+        finally:
+            await self.release(worker)
+
+    async def close(self):
+        workers, self.idle = self.idle, []
+        for worker in workers:
+            self.retire(worker)
+        await asyncio.gather(*self.closing)
+
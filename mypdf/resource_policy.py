@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import mimetypes
+from urllib.parse import urlparse
+
+
+TRACKER_DOMAINS = (
+    'google-analytics.com', 'googletagmanager.com', 'googletagservices.com', 'doubleclick.net',
+    'googlesyndication.com', 'googleadservices.com', 'adservice.google.com', 'connect.facebook.net',
+    'facebook.net', 'analytics.twitter.com', 'ads-twitter.com', 'static.ads-twitter.com', 'bat.bing.com',
+    'clarity.ms', 'hotjar.com', 'mouseflow.com', 'fullstory.com', 'segment.io', 'segment.com',
+    'mixpanel.com', 'amplitude.com', 'heap.io', 'heapanalytics.com', 'newrelic.com', 'nr-data.net',
+    'scorecardresearch.com', 'quantserve.com', 'quantcount.com', 'chartbeat.com', 'chartbeat.net',
+    'adnxs.com', 'criteo.com', 'criteo.net', 'taboola.com', 'outbrain.com', 'amazon-adsystem.com',
+    'adsrvr.org', 'rubiconproject.com', 'pubmatic.com', 'openx.net', 'casalemedia.com', 'moatads.com',
+    'optimizely.com', 'onetrust.com', 'cookielaw.org', 'hm.baidu.com', 'cnzz.com', 'umeng.com',
+    'tongji.baidu.com', 'pos.baidu.com', 'cpro.baidu.com', 'zz.bdstatic.com', 'mc.yandex.ru',
+    'tiqcdn.com', 'krxd.net', 'bluekai.com', 'demdex.net', 'omtrdc.net'
+)
+
+SECOND_LEVEL_LABELS = ('co', 'com', 'net', 'org', 'gov', 'edu', 'ac')
+
+TYPICAL_SIZES = {
+    'image': 40 * 1024,
+    'media': 1024 * 1024,
+    'font': 60 * 1024,
+    'script': 30 * 1024,
+    'tracker': 15 * 1024
+}
+
+MIME_TYPES = {
+    'image': ('image/',),
+    'media': ('video/', 'audio/'),
+    'font': ('font/', 'application/font', 'application/x-font', 'application/vnd.ms-fontobject')
+}
+
+
+def site_of(host):
+    labels = (host or '').lower().split('.')
+    if len(labels) > 2 and labels[-2] in SECOND_LEVEL_LABELS:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+
+def host_matches(host, domains):
+    host = (host or '').lower()
+    return any(host == d or host.endswith('.' + d) for d in domains)
+
+
+class BlockStats:
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.reasons = {}
+
+    def add(self, reason, category):
+        self.requests += 1
+        self.bytes += TYPICAL_SIZES.get(category, 0)
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    def to_dict(self):
+        return {'requests': self.requests, 'estimated_bytes': self.bytes, 'reasons': dict(self.reasons)}
+
+
+class ResourcePolicy:
+    def __init__(self, config):
+        self.blocked_categories = set()
+        if config.get('block_images'):
+            self.blocked_categories.add('image')
+        if config.get('block_media'):
+            self.blocked_categories.add('media')
+        if config.get('block_fonts'):
+            self.blocked_categories.add('font')
+
+        self.block_trackers = config.get('block_trackers', False)
+        self.block_third_party_scripts = config.get('block_third_party_scripts', False)
+        self.blocked_domains = tuple(d.lower() for d in config.get('blocked_domains', []))
+        self.allowed_domains = tuple(d.lower() for d in config.get('allowed_domains', []))
+
+    @property
+    def enabled(self):
+        return bool(self.blocked_categories or self.block_trackers or self.block_third_party_scripts
+                    or self.blocked_domains)
+
+    def category(self, request):
+        resource_type = request.resource_type
+        if resource_type in ('image', 'media', 'font'):
+            return resource_type
+
+        accept = request.headers.get('accept', '').lower()
+        mime = mimetypes.guess_type(urlparse(request.url).path)[0] or ''
+        for category, prefixes in MIME_TYPES.items():
+            if accept.startswith(prefixes) or mime.startswith(prefixes):
+                return category
+        return resource_type
+
+    def decide(self, request, page_url):
+        host = urlparse(request.url).hostname or ''
+        if host_matches(host, self.allowed_domains):
+            return None, None
+        if request.is_navigation_request() and request.frame.parent_frame is None:
+            return None, None
+
+        if host_matches(host, self.blocked_domains):
+            return 'domain', 'tracker'
+        if self.block_trackers and host_matches(host, TRACKER_DOMAINS):
+            return 'tracker', 'tracker'
+
+        category = self.category(request)
+        if category in self.blocked_categories:
+            return category, category
+
+        if (self.block_third_party_scripts and category == 'script'
+                and site_of(host) != site_of(urlparse(page_url).hostname)):
+            return 'third_party_script', 'script'
+
+        return None, None
+
+    def route_handler(self, page_url, stats, fallback=None):
+        async def handle(route):
+            reason, category = self.decide(route.request, page_url)
+            if reason:
+                stats.add(reason, category)
+                await route.abort('blockedbyclient')
+            elif fallback is not None:
+                await fallback(route)
+            else:
+                await route.continue_()
+        return handle
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import random
+import asyncio
+import aiohttp
+
+if __package__:
+    from .host_scheduler import HostThrottled
+else:
+    from host_scheduler import HostThrottled
+
+
+RETRYABLE_STATUSES = (408, 425, 500, 502, 503, 504, 520, 521, 522, 523, 524)
+RETRYABLE_NET_ERRORS = (
+    'net::ERR_CONNECTION', 'net::ERR_TIMED_OUT', 'net::ERR_NETWORK_CHANGED', 'net::ERR_EMPTY_RESPONSE',
+    'net::ERR_NAME_NOT_RESOLVED', 'net::ERR_ADDRESS_UNREACHABLE', 'net::ERR_SSL_PROTOCOL_ERROR',
+    'net::ERR_HTTP2_PROTOCOL_ERROR', 'Target closed', 'Browser has been closed'
+)
+
+
+class RemoteError(Exception):
+    def __init__(self, message, kind):
+        super().__init__(message)
+        self.kind = kind
+
+
+class HostUnavailable(Exception):
+    def __init__(self, host, remaining):
+        super().__init__(f'站点暂不可用（熔断中，{remaining:.0f} 秒后再试）: {host}')
+        self.host = host
+
+
+def classify_error(error):
+    if isinstance(error, HostThrottled):
+        return 'throttle'
+    if isinstance(error, HostUnavailable):
+        return 'fatal'
+    if isinstance(error, RemoteError):
+        return error.kind
+    if isinstance(error, aiohttp.ClientResponseError):
+        return 'retryable' if error.status in RETRYABLE_STATUSES else 'fatal'
+    if isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                          asyncio.TimeoutError, ConnectionError)):
+        return 'retryable'
+
+    module = type(error).__module__ or ''
+    if module.startswith('playwright'):
+        if type(error).__name__ == 'TimeoutError':
+            return 'retryable'
+        message = str(error)
+        if any(marker in message for marker in RETRYABLE_NET_ERRORS):
+            return 'retryable'
+    return 'fatal'
+
+
+class RetryPolicy:
+    def __init__(self, attempts=3, base_delay=1.0, max_delay=30.0):
+        self.attempts = max(0, int(attempts))
+        self.base_delay = max(0.0, float(base_delay))
+        self.max_delay = max(self.base_delay, float(max_delay))
+
+    def delay(self, attempt):
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+class RetryBudget:
+    def __init__(self, ratio=0.2, minimum=10):
+        self.ratio = max(0.0, float(ratio))
+        self.tokens = float(minimum)
+
+    def deposit(self):
+        self.tokens += self.ratio
+
+    def withdraw(self):
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=5, cooldown=60.0):
+        self.threshold = max(1, int(threshold))
+        self.cooldown = max(0.0, float(cooldown))
+        self.hosts = {}
+
+    def check(self, host):
+        state = self.hosts.get(host)
+        if state is None or state['opened_at'] is None:
+            return
+
+        remaining = state['opened_at'] + self.cooldown - time.monotonic()
+        if remaining > 0 or state['probing']:
+            raise HostUnavailable(host, max(0, remaining))
+        state['probing'] = True
+
+    def success(self, host):
+        self.hosts.pop(host, None)
+
+    def failure(self, host):
+        state = self.hosts.setdefault(host, {'failures': 0, 'opened_at': None, 'probing': False})
+        state['failures'] += 1
+        if state['probing'] or state['failures'] >= self.threshold:
+            state['opened_at'] = time.monotonic()
+        state['probing'] = False
+
+    def release(self, host):
+        state = self.hosts.get(host)
+        if state is not None:
+            state['probing'] = False
+
+    def open_hosts(self):
+        return [host for host, state in self.hosts.items() if state['opened_at'] is not None]
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import asyncio
+
+
+SETTLE_INIT_JS = """
+(() => {
+    if (window.__pdfSettle) return;
+    const state = window.__pdfSettle = {lastMutation: performance.now(), pendingDecodes: 0};
+
+    const observe = () => {
+        new MutationObserver(() => { state.lastMutation = performance.now(); }).observe(document.documentElement, {
+            childList: true, subtree: true, characterData: true, attributes: true, attributeFilter: ['src', 'srcset']
+        });
+    };
+    if (document.documentElement) observe(); else document.addEventListener('DOMContentLoaded', observe);
+
+    document.addEventListener('load', event => {
+        const img = event.target;
+        if (!(img instanceof HTMLImageElement) || !img.decode) return;
+        state.pendingDecodes++;
+        img.decode().catch(() => {}).finally(() => { state.pendingDecodes--; });
+    }, true);
+})();
+"""
+
+SETTLE_CHECK_JS = """
+() => {
+    const state = window.__pdfSettle || {lastMutation: 0, pendingDecodes: 0};
+    const pendingImages = Array.from(document.images)
+        .filter(img => img.currentSrc || img.src)
+        .filter(img => !img.complete && img.loading !== 'lazy').length;
+    return {
+        quietFor: performance.now() - state.lastMutation,
+        pendingImages: pendingImages,
+        pendingDecodes: state.pendingDecodes
+    };
+}
+"""
+
+
+class SettleTracker:
+    def __init__(self, page, stale_after=5.0):
+        self.stale_after = stale_after
+        self.inflight = {}
+        self.last_activity = time.monotonic()
+
+        page.on('request', self.on_request_started)
+        page.on('requestfinished', self.on_request_done)
+        page.on('requestfailed', self.on_request_done)
+
+    def on_request_started(self, request):
+        self.inflight[request] = time.monotonic()
+        self.last_activity = time.monotonic()
+
+    def on_request_done(self, request):
+        self.inflight.pop(request, None)
+        self.last_activity = time.monotonic()
+
+    def pending(self):
+        now = time.monotonic()
+        return sum(1 for started in self.inflight.values() if now - started < self.stale_after)
+
+    def idle_for(self):
+        return time.monotonic() - self.last_activity
+
+
+async def wait_for_settle(page, tracker, timeout, quiet=0.5, stop_event=None, interval=0.1):
+    deadline = time.monotonic() + max(0, timeout)
+    quiet_ms = quiet * 1000
+
+    while True:
+        if stop_event is not None and stop_event.is_set():
+            return False
+
+        try:
+            state = await page.evaluate(SETTLE_CHECK_JS)
+        except Exception:
+            state = None
+
+        if (
+            state is not None
+            and tracker.pending() == 0
+            and tracker.idle_for() >= quiet
+            and state['quietFor'] >= quiet_ms
+            and state['pendingImages'] == 0
+            and state['pendingDecodes'] == 0
+        ):
+            return True
+
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(interval)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import hashlib
+
+
+MIN_CHUNK = 64 * 1024
+FAST_FLUSH = 0.05
+SLOW_FLUSH = 0.5
+FSYNC_POLICIES = ('none', 'commit', 'periodic')
+
+
+def pwrite(fd, data, offset):
+    data = memoryview(data)
+    if hasattr(os, 'pwrite'):
+        while data:
+            written = os.pwrite(fd, data, offset)
+            data = data[written:]
+            offset += written
+    else:
+        os.lseek(fd, offset, os.SEEK_SET)
+        while data:
+            written = os.write(fd, data)
+            data = data[written:]
+
+
+def fsync(fd):
+    if hasattr(os, 'fdatasync'):
+        os.fdatasync(fd)
+    else:
+        os.fsync(fd)
+
+
+class StreamHash:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.digest = hashlib.sha256()
+        self.offset = 0
+
+    def update(self, offset, data):
+        if offset == self.offset:
+            self.digest.update(data)
+            self.offset += len(data)
+
+    def finish(self, path, chunk_size=1024 * 1024):
+        with open(path, 'rb') as f:
+            f.seek(self.offset)
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                self.update(self.offset, chunk)
+        return self.digest.hexdigest()
+
+
+class BufferPool:
+    def __init__(self, size, limit=64):
+        self.size = max(MIN_CHUNK, int(size))
+        self.limit = limit
+        self.free = []
+
+    def acquire(self):
+        return self.free.pop() if self.free else bytearray(self.size)
+
+    def release(self, buffer):
+        if len(buffer) == self.size and len(self.free) < self.limit:
+            self.free.append(buffer)
+
+
+class StreamWriter:
+    def __init__(self, fd, offset, buffer, digest=None, sync_interval=0):
+        self.fd = fd
+        self.offset = offset
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.filled = 0
+        self.chunk_size = min(MIN_CHUNK, len(buffer))
+        self.digest = digest
+        self.sync_interval = sync_interval
+        self.unsynced = 0
+        self.last_flush = time.monotonic()
+
+    @property
+    def position(self):
+        return self.offset + self.filled
+
+    def write(self, data):
+        data = memoryview(data)
+        if not self.filled and len(data) >= self.chunk_size:
+            self.commit(data)
+            return len(data)
+
+        flushed = 0
+        while data:
+            size = min(len(data), self.chunk_size - self.filled)
+            self.view[self.filled:self.filled + size] = data[:size]
+            self.filled += size
+            data = data[size:]
+            if self.filled >= self.chunk_size:
+                flushed += self.flush()
+        return flushed
+
+    def flush(self):
+        size = self.filled
+        if size:
+            self.commit(self.view[:size])
+            self.filled = 0
+        return size
+
+    def commit(self, data):
+        if self.digest is not None:
+            self.digest.update(self.offset, data)
+        pwrite(self.fd, data, self.offset)
+        self.offset += len(data)
+        self.unsynced += len(data)
+
+        now = time.monotonic()
+        elapsed = now - self.last_flush
+        self.last_flush = now
+        if elapsed < FAST_FLUSH:
+            self.chunk_size = min(self.chunk_size * 2, len(self.buffer))
+        elif elapsed > SLOW_FLUSH:
+            self.chunk_size = max(self.chunk_size // 2, MIN_CHUNK)
+
+    def sync_due(self):
+        return self.sync_interval > 0 and self.unsynced >= self.sync_interval
+
+    def sync(self):
+        fsync(self.fd)
+        self.unsynced = 0
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import time
+import json
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from email.utils import parsedate_to_datetime
+
+
+CACHEABLE_TYPES = ('stylesheet', 'script', 'font', 'image')
+HOP_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding', 'connection', 'set-cookie')
+
+
+def parse_cache_control(value):
+    directives = {}
+    for part in (value or '').lower().split(','):
+        name, _, arg = part.strip().partition('=')
+        if name:
+            directives[name] = arg.strip('"')
+    return directives
+
+
+def http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness_lifetime(headers, now):
+    directives = parse_cache_control(headers.get('cache-control'))
+    for name in ('s-maxage', 'max-age'):
+        if re.fullmatch(r'\d+', directives.get(name, '')):
+            return int(directives[name])
+
+    expires = http_date(headers.get('expires'))
+    if expires is not None:
+        return max(0, expires - (http_date(headers.get('date')) or now))
+
+    last_modified = http_date(headers.get('last-modified'))
+    if last_modified is not None:
+        return max(0, ((http_date(headers.get('date')) or now) - last_modified) / 10)
+
+    return 0
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.bytes_served = 0
+
+    def to_dict(self):
+        total = self.hits + self.revalidated + self.misses
+        return {
+            'hits': self.hits,
+            'revalidated': self.revalidated,
+            'misses': self.misses,
+            'bytes_served': self.bytes_served,
+            'hit_rate': round((self.hits + self.revalidated) / total, 3) if total else 0.0
+        }
+
+
+class SubresourceCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.db = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('PRAGMA busy_timeout=5000')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                status INTEGER,
+                headers TEXT,
+                size INTEGER,
+                expires REAL,
+                etag TEXT,
+                last_modified TEXT,
+                last_access REAL
+            )
+        ''')
+        self.db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)')
+        self.db.execute("INSERT OR IGNORE INTO meta SELECT 'total', COALESCE(SUM(size), 0) FROM entries")
+        self.db.commit()
+
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def body_path(self, url):
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name[:2], name)
+
+    def lookup(self, url):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT status, headers, size, expires, etag, last_modified FROM entries WHERE url = ?', (url,)
+            ).fetchone()
+        if row is None or not os.path.exists(self.body_path(url)):
+            return None
+        status, headers, size, expires, etag, last_modified = row
+        return {'status': status, 'headers': json.loads(headers), 'size': size, 'expires': expires,
+                'etag': etag, 'last_modified': last_modified}
+
+    def load(self, url):
+        entry = self.lookup(url)
+        body = self.read_body(url) if entry else None
+        return (entry, body) if body is not None else (None, None)
+
+    def read_body(self, url):
+        try:
+            with open(self.body_path(url), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def touch(self, url, expires=None):
+        with self.lock:
+            if expires is None:
+                self.db.execute('UPDATE entries SET last_access = ? WHERE url = ?', (time.time(), url))
+            else:
+                self.db.execute('UPDATE entries SET last_access = ?, expires = ? WHERE url = ?',
+                                (time.time(), expires, url))
+            self.db.commit()
+
+    def storable(self, status, headers, body):
+        directives = parse_cache_control(headers.get('cache-control'))
+        if status != 200 or 'no-store' in directives:
+            return False
+        if headers.get('vary', '').strip().lower() not in ('', 'accept-encoding', 'origin'):
+            return False
+        if len(body) > self.max_bytes // 10:
+            return False
+        return True
+
+    def store(self, url, status, headers, body, now):
+        headers = {k: v for k, v in headers.items() if k.lower() not in HOP_HEADERS}
+        lifetime = 0 if 'no-cache' in parse_cache_control(headers.get('cache-control')) \
+            else freshness_lifetime(headers, now)
+        if lifetime <= 0 and not (headers.get('etag') or headers.get('last-modified')):
+            return
+
+        path = self.body_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.db.execute('SELECT size FROM entries WHERE url = ?', (url,)).fetchone()
+                self.db.execute(
+                    'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (url, status, json.dumps(headers), len(body), now + lifetime,
+                     headers.get('etag', ''), headers.get('last-modified', ''), now)
+                )
+                self.db.execute("UPDATE meta SET value = value + ? WHERE key = 'total'",
+                                (len(body) - (row[0] if row else 0),))
+                self.evict()
+            except BaseException:
+                self.db.rollback()
+                raise
+            self.db.commit()
+
+    def evict(self):
+        total = self.db.execute("SELECT value FROM meta WHERE key = 'total'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        target = self.max_bytes * 0.9
+        rows = self.db.execute('SELECT url, size FROM entries ORDER BY last_access').fetchall()
+        for url, size in rows:
+            if total <= target:
+                break
+            self.db.execute('DELETE FROM entries WHERE url = ?', (url,))
+            try:
+                os.remove(self.body_path(url))
+            except OSError:
+                pass
+            total -= size
+        self.db.execute("UPDATE meta SET value = ? WHERE key = 'total'", (total,))
+
+    async def handle(self, route, stats):
+        request = route.request
+        if request.method != 'GET' or request.resource_type not in CACHEABLE_TYPES:
+            await route.continue_()
+            return
+
+        try:
+            await self.respond(route, request, stats)
+        except Exception:
+            try:
+                await route.continue_()
+            except Exception:
+                pass
+
+    async def respond(self, route, request, stats):
+        url = request.url
+        now = time.time()
+        entry, cached = await self.run(self.load, url)
+
+        if entry and entry['expires'] > now:
+            await self.serve(route, url, entry, cached, stats)
+            stats.hits += 1
+            self.stats.hits += 1
+            return
+
+        headers = dict(request.headers)
+        if entry:
+            if entry['etag']:
+                headers['if-none-match'] = entry['etag']
+            if entry['last_modified']:
+                headers['if-modified-since'] = entry['last_modified']
+
+        try:
+            response = await route.fetch(headers=headers)
+            body = await response.body()
+        except Exception:
+            await route.abort()
+            return
+        response_headers = {k.lower(): v for k, v in response.headers.items()}
+        if response.status == 304 and entry:
+            await self.run(self.touch, url, now + freshness_lifetime(dict(entry['headers'], **response_headers), now))
+            await self.serve(route, url, entry, cached, stats)
+            stats.revalidated += 1
+            self.stats.revalidated += 1
+            return
+
+        if self.storable(response.status, response_headers, body):
+            try:
+                await self.run(self.store, url, response.status, response_headers, body, now)
+            except (OSError, sqlite3.Error):
+                pass
+        stats.misses += 1
+        self.stats.misses += 1
+        await route.fulfill(response=response, body=body)
+
+    async def serve(self, route, url, entry, body, stats):
+        await self.run(self.touch, url)
+        stats.bytes_served += len(body)
+        self.stats.bytes_served += len(body)
+        await route.fulfill(status=entry['status'], headers=entry['headers'], body=body)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from tkinter import ttk
+
+
+COLUMNS = (('序号', 50), ('地址', 300), ('状态', 80), ('进度', 80), ('文件名', 200))
+
+STATUS_FILTERS = {
+    '全部': None,
+    '等待中': 'pending',
+    '进行中': 'downloading',
+    '完成': 'success',
+    '失败': 'error'
+}
+
+
+def status_tag(status):
+    if status in ('下载中', '续传中', '优化中'):
+        return 'downloading'
+    if status in ('完成', '未变化'):
+        return 'success'
+    if '失败' in status or '错误' in status:
+        return 'error'
+    return 'pending'
+
+
+class TaskStore:
+    def __init__(self):
+        self.rows = []
+        self.tag_filter = None
+        self.filtered = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, url):
+        self.rows.append([len(self.rows) + 1, url, '等待中', '', '', 'pending'])
+        self.filtered = None
+        return len(self.rows) - 1
+
+    def clear(self):
+        self.rows = []
+        self.filtered = None
+
+    def update(self, index, status, progress='', filename=''):
+        row = self.rows[index]
+        row[2] = status
+        if progress:
+            row[3] = progress
+        if filename:
+            row[4] = filename
+
+        tag = status_tag(status)
+        if tag != row[5]:
+            row[5] = tag
+            if self.tag_filter is not None:
+                self.filtered = None
+
+    def set_filter(self, tag):
+        self.tag_filter = tag
+        self.filtered = None
+
+    def visible(self):
+        if self.tag_filter is None:
+            return range(len(self.rows))
+        if self.filtered is None:
+            self.filtered = [i for i, row in enumerate(self.rows) if row[5] == self.tag_filter]
+        return self.filtered
+
+
+class VirtualTaskView(ttk.Frame):
+    def __init__(self, master, store, row_height=20):
+        super().__init__(master)
+        self.store = store
+        self.row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or row_height)
+        self.offset = 0
+        self.slots = []
+        self.capacity = 15
+
+        self.tree = ttk.Treeview(self, columns=[name for name, _ in COLUMNS], show='headings',
+                                 height=self.capacity, selectmode='none')
+        for name, width in COLUMNS:
+            self.tree.heading(name, text=name)
+            self.tree.column(name, width=width)
+
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.on_scroll)
+
+        self.tree.pack(side='left', fill='both', expand=True)
+        self.scrollbar.pack(side='right', fill='y')
+
+        self.tree.tag_configure('pending', foreground='gray')
+        self.tree.tag_configure('downloading', foreground='blue')
+        self.tree.tag_configure('success', foreground='green')
+        self.tree.tag_configure('error', foreground='red')
+
+        self.tree.bind('<Configure>', self.on_configure)
+        self.tree.bind('<MouseWheel>', self.on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self.scroll_by(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll_by(3))
+
+    def on_configure(self, event):
+        capacity = max(1, (event.height - self.row_height) // self.row_height)
+        if capacity != self.capacity:
+            self.capacity = capacity
+            self.refresh()
+
+    def on_mousewheel(self, event):
+        self.scroll_by(-3 if event.delta > 0 else 3)
+        return 'break'
+
+    def on_scroll(self, action, value, unit=None):
+        if action == 'moveto':
+            self.offset = int(float(value) * len(self.store.visible()))
+        elif unit == 'pages':
+            self.offset += int(value) * self.capacity
+        else:
+            self.offset += int(value)
+        self.refresh()
+
+    def scroll_by(self, rows):
+        self.offset += rows
+        self.refresh()
+
+    def refresh(self):
+        rows = self.store.visible()
+        total = len(rows)
+        self.offset = max(0, min(self.offset, total - self.capacity))
+
+        count = min(self.capacity, total - self.offset)
+        while len(self.slots) < count:
+            self.slots.append(self.tree.insert('', 'end'))
+        while len(self.slots) > count:
+            self.tree.delete(self.slots.pop())
+
+        for slot, index in zip(self.slots, rows[self.offset:self.offset + count]):
+            row = self.store.rows[index]
+            self.tree.item(slot, values=row[:5], tags=(row[5],))
+
+        if total:
+            self.scrollbar.set(self.offset / total, (self.offset + count) / total)
+        else:
+            self.scrollbar.set(0, 1)
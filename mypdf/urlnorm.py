@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from fnmatch import fnmatchcase
+from urllib.parse import urlsplit, urlunsplit
+
+
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+
+def strip_query(query, patterns):
+    if not query or not patterns:
+        return query
+    kept = [pair for pair in query.split('&')
+            if pair and not any(fnmatchcase(pair.partition('=')[0].lower(), p) for p in patterns)]
+    return '&'.join(kept)
+
+
+def normalize_url(url, strip_params=()):
+    url = url.strip()
+    if not url.lower().startswith(('http://', 'https://')):
+        url = 'https://' + url
+
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if not host:
+        raise ValueError(f"无效的地址: {url}")
+    if ':' in host:
+        host = f"[{host}]"
+    if parts.port and str(parts.port) != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if parts.username:
+        userinfo = parts.username + (f":{parts.password}" if parts.password else '')
+        host = f"{userinfo}@{host}"
+
+    return urlunsplit((scheme, host, parts.path or '/', strip_query(parts.query, strip_params), ''))